@@ -0,0 +1,29 @@
+import time
+from typing import Optional
+
+# Respostas das consultas por seq_auto_infracao (agregação e completo): leituras
+# determinísticas, reaproveitadas por RESPOSTA_TTL_SEGUNDOS e descartadas pelos
+# uploads; no máximo RESPOSTA_CACHE_MAX entradas (sai a mais antiga).
+# O cache é do processo: outros workers do uvicorn dependem do TTL
+RESPOSTA_TTL_SEGUNDOS = 60
+RESPOSTA_CACHE_MAX = 1024
+_resposta_cache: dict[tuple[str, int], tuple[float, dict]] = {}
+
+
+def resposta_em_cache(chave: tuple[str, int]) -> Optional[dict]:
+    em_cache = _resposta_cache.get(chave)
+    if em_cache and time.monotonic() - em_cache[0] < RESPOSTA_TTL_SEGUNDOS:
+        return em_cache[1]
+    return None
+
+
+def guardar_resposta(chave: tuple[str, int], resposta: dict) -> None:
+    _resposta_cache.pop(chave, None)
+    _resposta_cache[chave] = (time.monotonic(), resposta)
+    if len(_resposta_cache) > RESPOSTA_CACHE_MAX:
+        del _resposta_cache[next(iter(_resposta_cache))]
+
+
+def limpar_cache_respostas() -> None:
+    """Descarta as respostas em cache; chamada pelos uploads de autos, enquadramentos e espécimes."""
+    _resposta_cache.clear()
@@ -0,0 +1,169 @@
+"""
+Leitura e conversão dos blocos do CSV de autos de infração.
+
+Módulo sem dependência do banco nem das rotas: é o que os processos de
+conversão do upload importam.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter, ValidationError
+
+from models.auto_infracao import AutoInfracaoCreate
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
+
+# Blocos de bytes do arquivo, sempre terminados em fim de linha
+TAMANHO_BLOCO_BYTES = 16 * 1024 * 1024
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 8
+
+# Validação em lote (uma chamada ao pydantic-core para o bloco inteiro)
+_AUTOS_ADAPTER = TypeAdapter(list[AutoInfracaoCreate])
+
+COLUNA_AUTO_INFRACAO = {
+    "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
+    "TIPO_AUTO": "tipo_auto",
+    "VAL_AUTO_INFRACAO": "val_auto_infracao",
+    "MOTIVACAO_CONDUTA": "motivacao_conduta",
+    "EFEITO_SAUDE_PUBLICA": "efeito_saude_publica",
+    "DAT_HORA_AUTO_INFRACAO": "dat_hora_auto_infracao",
+    "MUNICIPIO": "municipio",
+    "NUM_LONGITUDE_AUTO": "num_longitude",
+    "NUM_LATITUDE_AUTO": "num_latitude",
+    "DS_BIOMAS_ATINGIDOS": "bioma"
+}
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = n_bits = 0
+    even = True
+    while len(geohash) < precision:
+        # Bits alternados: longitude nos pares, latitude nos ímpares
+        faixa, valor = (lon_range, lon) if even else (lat_range, lat)
+        mid = (faixa[0] + faixa[1]) / 2
+        if valor >= mid:
+            bits = bits * 2 + 1
+            faixa[0] = mid
+        else:
+            bits = bits * 2
+            faixa[1] = mid
+        even = not even
+        n_bits += 1
+        if n_bits == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = n_bits = 0
+    return "".join(geohash)
+
+
+def blocos_csv(arquivo):
+    """
+    Divide o arquivo em blocos de bytes de ~TAMANHO_BLOCO_BYTES terminados em
+    fim de linha, cada um precedido do cabeçalho. Só E/S: o parsing fica com
+    os processos de conversão. Supõe registros de uma linha (sem quebras
+    dentro de campos entre aspas).
+    """
+    cabecalho = arquivo.readline()
+    while True:
+        bloco = arquivo.read(TAMANHO_BLOCO_BYTES)
+        if not bloco:
+            return
+        yield cabecalho + bloco + arquivo.readline()
+
+
+def _ler_bloco(bloco: bytes) -> pd.DataFrame:
+    """
+    Lê um bloco (cabeçalho + linhas) como texto. Usa o leitor multi-thread do
+    pyarrow quando instalado e, na falta dele, o read_csv do pandas.
+    """
+    if pacsv is None:
+        return pd.read_csv(
+            io.BytesIO(bloco),
+            sep=";",
+            dtype=str,
+            keep_default_na=False,
+            na_values=['']
+        )
+
+    colunas = list(COLUNA_AUTO_INFRACAO)
+    tabela = pacsv.read_csv(
+        pa.py_buffer(bloco),
+        parse_options=pacsv.ParseOptions(delimiter=";"),
+        convert_options=pacsv.ConvertOptions(
+            column_types={col: pa.string() for col in colunas},
+            include_columns=colunas,
+            include_missing_columns=True,
+            null_values=[""],
+            strings_can_be_null=True
+        )
+    )
+    return tabela.to_pandas()
+
+
+def validar_autos(documentos: list[dict]) -> tuple[list[dict], int]:
+    """
+    Valida o bloco contra AutoInfracaoCreate e descarta os documentos rejeitados.
+    """
+    try:
+        _AUTOS_ADAPTER.validate_python(documentos)
+    except ValidationError as e:
+        invalidos = {erro["loc"][0] for erro in e.errors()}
+        documentos = [doc for i, doc in enumerate(documentos) if i not in invalidos]
+        return documentos, len(invalidos)
+    return documentos, 0
+
+
+def preparar_autos(df: pd.DataFrame, validar: bool = False) -> tuple[list[dict], int]:
+    """
+    Converte um bloco do CSV e devolve os documentos válidos e o número de linhas descartadas.
+    Síncrona e CPU-bound: deve rodar fora do event loop.
+    """
+    # Colunas ausentes no CSV viram NaN e invalidam as linhas, como faria o modelo
+    df = df.reindex(columns=list(COLUNA_AUTO_INFRACAO)).astype(object).rename(columns=COLUNA_AUTO_INFRACAO)
+
+    # Conversões vetorizadas (valores inválidos viram NaN/NaT)
+    seq = df["seq_auto_infracao"].str.strip()
+    df["seq_auto_infracao"] = pd.to_numeric(seq.where(seq.str.fullmatch(r"\d+", na=False)), errors="coerce")
+    for col in ("val_auto_infracao", "num_longitude", "num_latitude"):
+        df[col] = pd.to_numeric(df[col].str.replace(",", ".", regex=False).str.strip(), errors="coerce")
+    df["dat_hora_auto_infracao"] = pd.to_datetime(
+        df["dat_hora_auto_infracao"].str.strip(), format="%Y-%m-%d %H:%M:%S", errors="coerce"
+    )
+
+    # Verifica se campos obrigatórios estão presentes e válidos
+    campos_numericos = ["seq_auto_infracao", "val_auto_infracao", "num_longitude", "num_latitude"]
+    mask = df.notna().all(axis=1) & np.isfinite(df[campos_numericos]).all(axis=1)
+    # Fora da faixa o ponto GeoJSON é recusado pelo índice 2dsphere (em silêncio com w=0)
+    mask &= df["num_longitude"].between(-180, 180) & df["num_latitude"].between(-90, 90)
+    erros_processamento = int((~mask).sum())
+
+    df = df.loc[mask].astype({"seq_auto_infracao": "int64"})
+    df["location"] = [
+        {"type": "Point", "coordinates": [lon, lat]}
+        for lon, lat in zip(df["num_longitude"], df["num_latitude"])
+    ]
+    # Laço Python por linha (geohash): é o que justifica converter em processos
+    df["geohash"] = [
+        geohash_encode(lat, lon)
+        for lat, lon in zip(df["num_latitude"], df["num_longitude"])
+    ]
+    documentos = df.to_dict("records")
+
+    # Os tipos já foram garantidos pelo pandas; o modelo só é aplicado sob demanda
+    if validar:
+        documentos, erros_validacao = validar_autos(documentos)
+        erros_processamento += erros_validacao
+    return documentos, erros_processamento
+
+
+def converter_bloco(bloco: bytes, validar: bool = False) -> tuple[list[dict], int]:
+    """Executada nos processos de conversão: recebe os bytes do bloco, não um DataFrame."""
+    return preparar_autos(_ler_bloco(bloco), validar)
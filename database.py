@@ -1,11 +1,21 @@
+import asyncio
 import os
 import motor.motor_asyncio
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
 
 load_dotenv()
 
 client = motor.motor_asyncio.AsyncIOMotorClient(
-    os.getenv("MONGO_URL")
+    os.getenv("MONGO_URL"),
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL", "50")),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL", "5")),
+    maxIdleTimeMS=60_000,
+    serverSelectionTimeoutMS=3000,
+    retryWrites=True,
+    # Compressão do protocolo; zstd/snappy exigem os pacotes zstandard/python-snappy
+    compressors="zstd,snappy,zlib",
+    zlibCompressionLevel=-1
 )
 
 database = client["IBAMAdb"]
@@ -15,4 +25,136 @@ enquadramento_collection = database["enquadramento"]
 bioma_collection = database["bioma"]
 especime_collection = database["especime"]
 edificio_IBAMA_collection = database["edificio_IBAMA"]
-infrator_collection = database["infrator"]
\ No newline at end of file
+infrator_collection = database["infrator"]
+
+
+async def inserir_em_lotes(
+    colecao,
+    documentos: list[dict],
+    tamanho_lote: int,
+    bypass_document_validation: bool = False
+) -> tuple[int, list[dict]]:
+    """
+    Insere em lotes não ordenados e concorrentes. Falhas de documentos isolados
+    (BulkWriteError) não abortam o upload: são devolvidas junto com o total inserido.
+    """
+    lotes = [documentos[i:i + tamanho_lote] for i in range(0, len(documentos), tamanho_lote)]
+    resultados = await asyncio.gather(*(
+        colecao.insert_many(lote, ordered=False, bypass_document_validation=bypass_document_validation)
+        for lote in lotes
+    ), return_exceptions=True)
+
+    inseridos = 0
+    erros_escrita = []
+    for res in resultados:
+        if isinstance(res, BulkWriteError):
+            inseridos += res.details.get("nInserted", 0)
+            erros_escrita.extend(res.details.get("writeErrors", []))
+        elif isinstance(res, Exception):
+            raise res
+        else:
+            inseridos += len(res.inserted_ids)
+    return inseridos, erros_escrita
+
+
+async def pagina_e_total(colecao, filtro: dict, skip: int, limit: int) -> tuple[list[dict], int]:
+    """
+    Página (ordenada por _id) e total de documentos do filtro em uma única ida
+    ao banco: o $facet divide o mesmo $match entre os dois resultados. O $sort
+    fica antes do $facet, onde pode usar o índice de _id em vez de ordenar em memória.
+    """
+    pipeline = [
+        {"$match": filtro},
+        {"$sort": {"_id": 1}},
+        {"$facet": {
+            "items": [{"$skip": skip}, {"$limit": limit}],
+            "total": [{"$count": "n"}]
+        }}
+    ]
+    resultado = (await colecao.aggregate(pipeline).to_list(1))[0]
+    total = resultado["total"][0]["n"] if resultado["total"] else 0
+    return resultado["items"], total
+
+
+async def ensure_indexes():
+    # Criações independentes: disparadas juntas, custam uma ida ao banco em vez de uma por índice
+    await asyncio.gather(
+        # --- Geo index ---
+        edificio_IBAMA_collection.create_index(
+            [("location", "2dsphere")],
+            name="location_2dsphere"
+        ),
+        auto_infracao_collection.create_index(
+            [("location", "2dsphere")],
+            name="auto_loc_2dsphere"
+        ),
+        auto_infracao_collection.create_index(
+            [("geohash", 1)], name="idx_auto_geohash"
+        ),
+
+        # --- Índices em auto_infracao para filtros e ordenação ---
+        auto_infracao_collection.create_index(
+            [("dat_hora_auto_infracao", 1), ("_id", 1)], name="idx_auto_data_id"
+        ),
+        auto_infracao_collection.create_index(
+            [("dat_hora_auto_infracao", 1), ("municipio", 1), ("tipo_auto", 1), ("val_auto_infracao", 1), ("_id", 1)],
+            name="idx_auto_data_covering"
+        ),
+        # Prefixo municipio também atende as buscas só por município
+        auto_infracao_collection.create_index(
+            [("municipio", 1), ("dat_hora_auto_infracao", -1), ("_id", -1)],
+            name="idx_auto_municipio_data"
+        ),
+        auto_infracao_collection.create_index(
+            [("bioma", 1), ("dat_hora_auto_infracao", -1)], name="idx_auto_bioma_data"
+        ),
+        auto_infracao_collection.create_index(
+            [("seq_auto_infracao", 1)], name="idx_auto_seq"
+        ),
+        auto_infracao_collection.create_index(
+            [("tipo_auto", "text")], name="idx_auto_tipo_auto"
+        ),
+        auto_infracao_collection.create_index(
+            [("efeito_saude_publica", 1)], name="idx_auto_efeito_saude"
+        ),
+
+        # --- Índices para lookups rápidos ---
+        # Chave seq_auto_infracao seguida dos campos projetados na listagem detalhada:
+        # o $lookup é resolvido só pelo índice, sem buscar os documentos
+        enquadramento_collection.create_index(
+            [("seq_auto_infracao", 1), ("sq_enquadramento", 1), ("tp_norma", 1), ("nu_norma", 1)],
+            name="idx_enq_seq_auto_covering"
+        ),
+        especime_collection.create_index(
+            [("seq_auto_infracao", 1), ("seq_especime", 1), ("quantidade", 1), ("nome_popular", 1)],
+            name="idx_esp_seq_auto_covering"
+        ),
+
+        # --- Índices em bioma para filtro, agrupamento e lookup por nome ---
+        # Prefixo bioma atende o filtro e o $group; ultima_atualizacao, o lookup das consultas complexas
+        bioma_collection.create_index(
+            [("bioma", 1), ("ultima_atualizacao", -1)], name="idx_bioma_bioma_data"
+        ),
+        # Collation pt/strength 2: igualdade sem diferenciar maiúsculas e minúsculas usando índice
+        bioma_collection.create_index(
+            [("bioma", 1)],
+            name="idx_bioma_bioma_ci",
+            collation={"locale": "pt", "strength": 2}
+        )
+    )
+
+
+async def backfill_auto_infracao_location():
+    """
+    Preenche o ponto GeoJSON dos autos de infração inseridos antes da busca por
+    proximidade usar o índice 2dsphere. A conversão roda inteira no servidor.
+    """
+    result = await auto_infracao_collection.update_many(
+        {
+            "location": {"$exists": False},
+            "num_longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+            "num_latitude": {"$type": "number", "$gte": -90, "$lte": 90}
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$num_longitude", "$num_latitude"]}}}]
+    )
+    return result.modified_count
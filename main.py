@@ -1,46 +1,47 @@
+import os
+import anyio
+import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from routes.biomaRoute import router as bioma_router
 from routes.edificioRouter import router as edificio_router
 from routes.especimeRouter import router as especime_router
 from routes.enquadramentoRouter import router as enquadramento_router
-from routes.AutoInfracaoRouter import router as auto_infracao_router
+from routes.AutoInfracaoRouter import router as auto_infracao_router, encerrar_pool_conversao
 from routes.infratorRouter import router as infrator_router
 from routes.complexQuerie import router as complex_queries_router
-from database import edificio_IBAMA_collection, auto_infracao_collection, enquadramento_collection, especime_collection
-from database import edificio_IBAMA_collection, auto_infracao_collection, enquadramento_collection, especime_collection, auto_infracao_collection
+from database import ensure_indexes
+
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    # uvloop não existe no Windows; segue com o loop padrão do asyncio
+    pass
 
 app = FastAPI(
     title="IBAMA API",
     description="API para upload e gerenciamento de dados do IBAMA",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 @app.on_event("startup")
-async def init_indexes():
-    # --- Geo index ---
-    await edificio_IBAMA_collection.create_index(
-        [("location", "2dsphere")],
-        name="location_2dsphere"
-    )
+async def init_thread_limiter():
+    # Rotas síncronas e run_in_threadpool (pandas, matplotlib) usam este limitador; padrão é 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREAD_LIMIT", "100"))
 
-    # --- Índices em auto_infracao para filtros e ordenação ---
-    await auto_infracao_collection.create_index(
-        [("dat_hora_auto_infracao", 1)], name="idx_auto_data"
-    )
-    await auto_infracao_collection.create_index(
-        [("municipio", 1)], name="idx_auto_municipio"
-    )
-    await auto_infracao_collection.create_index(
-        [("tipo_auto", "text")], name="idx_auto_tipo_auto"
-    )
+@app.on_event("startup")
+async def init_indexes():
+    # Índices são criados pelo scripts/ensure_indexes.py no deploy;
+    # RUN_MIGRATIONS=1 permite que um único worker os crie ao subir.
+    if os.getenv("RUN_MIGRATIONS") == "1":
+        await ensure_indexes()
 
-    # --- Índices para lookups rápidos ---
-    await enquadramento_collection.create_index(
-        [("seq_auto_infracao", 1)], name="idx_enq_seq_auto"
-    )
-    await especime_collection.create_index(
-        [("seq_auto_infracao", 1)], name="idx_esp_seq_auto"
-    )
+@app.on_event("shutdown")
+def shutdown_upload_pool():
+    # Processos da conversão dos uploads de autos de infração
+    encerrar_pool_conversao()
 
 app.include_router(bioma_router)
 app.include_router(edificio_router)
@@ -49,3 +50,13 @@ app.include_router(enquadramento_router)
 app.include_router(auto_infracao_router)
 app.include_router(infrator_router)
 app.include_router(complex_queries_router, prefix="/consultas-complexas", tags=["Consultas Complexas"])
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        loop="auto",
+        http="auto"
+    )
@@ -1,17 +1,12 @@
+from typing import Annotated
 from bson import ObjectId
+from pydantic import BeforeValidator
 
 
-class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+def validate_object_id(v) -> str:
+    if not ObjectId.is_valid(v):
+        raise ValueError("ID inválido")
+    return str(v)
 
-    @classmethod
-    def validate(cls, v, info=None):
-        if not ObjectId.is_valid(v):
-            raise ValueError("ID inválido")
-        return str(v)
 
-    @classmethod
-    def __get_pydantic_json_schema__(cls, core_schema, handler):
-        return {"type": "string"}
\ No newline at end of file
+PyObjectId = Annotated[str, BeforeValidator(validate_object_id)]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
 from pydantic import BaseModel, Field
 from models.PyObjectId import PyObjectId
@@ -28,11 +28,16 @@ class AutoInfracaoOut(AutoInfracao):
         }
         populate_by_name = True
 
+class AutoInfracaoCursor(BaseModel):
+    after_ts: datetime
+    after_id: str
+
 class PaginatedAutoInfracaoResponse(BaseModel):
     total: int
     page: int
     size: int
     items: List[AutoInfracaoOut]
+    next: Optional[AutoInfracaoCursor] = None
 
     class Config:
         json_encoders = {
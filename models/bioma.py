@@ -37,9 +37,21 @@ class PaginatedBiomaResponse(BaseModel):
     page: int
     size: int
     items: List[BiomaOut]
+    next_cursor: Optional[str] = None
 
     class Config:
         json_encoders = {
             ObjectId: str
         }
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class PaginationMeta(BaseModel):
+    total_items: int
+    total_pages: int
+    current_page: int
+    limit: int
+    next_cursor: Optional[str] = None
+
+class PaginatedBiomasResponse(BaseModel):
+    meta: PaginationMeta
+    data: List[BiomaOut]
@@ -1,106 +1,157 @@
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
-from fastapi.responses import StreamingResponse
-from models.auto_infracao import AutoInfracaoCreate, AutoInfracaoOut, PaginatedAutoInfracaoResponse
-from database import auto_infracao_collection
-import matplotlib.pyplot as plt
+from pymongo import WriteConcern
+from pymongo.errors import OperationFailure
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Request
+from fastapi.responses import Response, StreamingResponse
+from models.auto_infracao import AutoInfracaoOut
+from database import auto_infracao_collection, inserir_em_lotes
+from cache import limpar_cache_respostas
+from conversao_autos import GEOHASH_PRECISION, blocos_csv, converter_bloco, geohash_encode
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import pandas as pd
 import io
-from datetime import datetime, timedelta
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from datetime import date, datetime, time, timedelta
 import math
+import numpy as np
+import orjson
+from typing import Optional
 from logs.logger import logger
 
 router = APIRouter(prefix="/auto_infracao", tags=["Auto de Infração"])
 
-@router.post("/upload", response_model=list[AutoInfracaoOut])
-async def upload_auto_infracao_csv(file: UploadFile = File(...)):
+TAMANHO_LOTE = 500
+TAMANHO_LOTE_LEITURA = 500
+PROJECAO_LEITURA = {"location": 0, "geohash": 0}
+# Campos cobertos pelo índice idx_auto_data_covering: a busca por data não lê os documentos
+INDICE_POR_DATA = "idx_auto_data_covering"
+PROJECAO_POR_DATA = {
+    "_id": 1,
+    "dat_hora_auto_infracao": 1,
+    "municipio": 1,
+    "tipo_auto": 1,
+    "val_auto_infracao": 1
+}
+ORDEM_PAGINACAO = [("dat_hora_auto_infracao", 1), ("_id", 1)]
+
+# Processos para a conversão dos blocos do CSV, criados no primeiro upload. Cada
+# worker do uvicorn tem o seu pool: por padrão os núcleos são divididos entre eles
+UPLOAD_WORKERS = int(os.getenv(
+    "UPLOAD_WORKERS",
+    max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "4")))
+))
+_pool_conversao: Optional[ProcessPoolExecutor] = None
+
+# PNG do relatório de efeitos à saúde pública, indexado pela versão da coleção
+_report_cache: dict[str, bytes] = {}
+REPORT_MAX_AGE = 300
+
+def _pool() -> ProcessPoolExecutor:
+    global _pool_conversao
+    if _pool_conversao is None:
+        # spawn: um fork do worker copiaria as threads do Motor/anyio já em execução
+        _pool_conversao = ProcessPoolExecutor(
+            max_workers=UPLOAD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool_conversao
+
+def encerrar_pool_conversao() -> None:
+    """Encerra os processos de conversão; chamada no shutdown da aplicação."""
+    global _pool_conversao
+    if _pool_conversao is not None:
+        _pool_conversao.shutdown(wait=True, cancel_futures=True)
+        _pool_conversao = None
+
+async def _proximo_bloco(leitor, validar: bool = False) -> Optional[tuple[list[dict], int]]:
+    """
+    Lê os bytes do próximo bloco em uma thread e entrega ao pool de processos,
+    que faz a leitura do CSV e a conversão, CPU-bound.
+    """
+    bloco = await asyncio.to_thread(next, leitor, None)
+    if bloco is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(), converter_bloco, bloco, validar)
+
+@router.post("/upload")
+async def upload_auto_infracao_csv(
+    file: UploadFile = File(...),
+    confirmar_escrita: bool = Query(True, description="Se falso, insere sem aguardar confirmação do servidor (w=0)"),
+    validar: bool = Query(False, description="Valida cada bloco contra o modelo AutoInfracaoCreate antes de inserir")
+):
     logger.info(f"Iniciando upload de arquivo CSV de autos de infração: {file.filename}")
     try:
-        df = pd.read_csv(
-            io.BytesIO(await file.read()),
-            sep=";",
-            dtype=str,
-            keep_default_na=False,
-            na_values=['']
-        )
-        
-        logger.info(f"Arquivo CSV carregado com {len(df)} linhas")
-
-        coluna_map = {
-            "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
-            "TIPO_AUTO": "tipo_auto",
-            "VAL_AUTO_INFRACAO": "val_auto_infracao",
-            "MOTIVACAO_CONDUTA": "motivacao_conduta",
-            "EFEITO_SAUDE_PUBLICA": "efeito_saude_publica",
-            "DAT_HORA_AUTO_INFRACAO": "dat_hora_auto_infracao",
-            "MUNICIPIO": "municipio",
-            "NUM_LONGITUDE_AUTO": "num_longitude",
-            "NUM_LATITUDE_AUTO": "num_latitude",
-            "DS_BIOMAS_ATINGIDOS": "bioma"
-        }
+        colecao = auto_infracao_collection
+        if not confirmar_escrita:
+            colecao = auto_infracao_collection.with_options(write_concern=WriteConcern(w=0))
 
-        df = df[[col for col in coluna_map if col in df.columns]].rename(columns=coluna_map)
+        # Lê o arquivo em blocos direto do upload: a memória fica limitada a um bloco
+        leitor = blocos_csv(file.file)
 
-        documentos = []
+        total_inseridos = 0
         erros_processamento = 0
-        for i, row in df.iterrows():
-            try:
-                doc_dict = row.to_dict()
-
-                # Conversões seguras
-                seq_str = str(doc_dict.get("seq_auto_infracao") or "").strip()
-                doc_dict["seq_auto_infracao"] = int(seq_str) if seq_str.isdigit() else None
-
-                valor = str(doc_dict.get("val_auto_infracao") or "").replace(",", ".").strip()
-                doc_dict["val_auto_infracao"] = float(valor) if valor else None
-
-                data_str = str(doc_dict.get("dat_hora_auto_infracao") or "").strip()
-                doc_dict["dat_hora_auto_infracao"] = (
-                    datetime.strptime(data_str, "%Y-%m-%d %H:%M:%S") if data_str else None
-                )
-
-                lon = str(doc_dict.get("num_longitude") or "").replace(",", ".").strip()
-                lat = str(doc_dict.get("num_latitude") or "").replace(",", ".").strip()
-                doc_dict["num_longitude"] = float(lon) if lon else None
-                doc_dict["num_latitude"] = float(lat) if lat else None
-
-                # Verifica se campos obrigatórios estão presentes e válidos
-                campos_criticos = [
-                    doc_dict["seq_auto_infracao"],
-                    doc_dict["val_auto_infracao"],
-                    doc_dict["dat_hora_auto_infracao"],
-                    doc_dict["num_longitude"],
-                    doc_dict["num_latitude"]
-                ]
-                if any(
-                    val is None or (isinstance(val, float) and (math.isnan(val) or math.isinf(val)))
-                    for val in campos_criticos
-                ):
-                    raise ValueError("Valores obrigatórios ausentes ou inválidos.")
-
-                auto = AutoInfracaoCreate(**doc_dict)
-                documentos.append(auto.dict())
-
-            except Exception as e:
-                erros_processamento += 1
-                logger.warning(f"Erro na linha {i+1}: {e}")
-                continue
+        erros_escrita = []
+        tarefa = asyncio.ensure_future(_proximo_bloco(leitor, validar))
+        try:
+            while (bloco := await tarefa) is not None:
+                # O próximo bloco é convertido enquanto o atual é inserido
+                tarefa = asyncio.ensure_future(_proximo_bloco(leitor, validar))
+                documentos, erros_bloco = bloco
+                erros_processamento += erros_bloco
+                if documentos:
+                    logger.info(f"Processando inserção de {len(documentos)} autos de infração válidos")
+                    # O PyMongo não aceita bypass_document_validation com w=0
+                    inseridos, erros_lote = await inserir_em_lotes(
+                        colecao, documentos, TAMANHO_LOTE, bypass_document_validation=confirmar_escrita
+                    )
+                    total_inseridos += inseridos
+                    erros_escrita.extend(erros_lote)
+        finally:
+            # Em erro na inserção, o bloco já agendado não é mais aguardado
+            tarefa.cancel()
 
         if erros_processamento > 0:
             logger.warning(f"Total de {erros_processamento} erros durante o processamento")
+        if erros_escrita:
+            logger.warning(f"Total de {len(erros_escrita)} documentos rejeitados pelo banco")
 
-        if not documentos:
+        if not total_inseridos:
             logger.error("Nenhum registro válido encontrado após processamento")
             raise HTTPException(400, "Nenhum registro válido encontrado.")
 
-        logger.info(f"Processando inserção de {len(documentos)} autos de infração válidos")
-        res = await auto_infracao_collection.insert_many(documentos)
-        
-        logger.info(f"Upload concluído: {len(res.inserted_ids)} autos de infração inseridos com sucesso")
-        return [
-            AutoInfracaoOut(**{**doc, "_id": str(res.inserted_ids[idx])})
-            for idx, doc in enumerate(documentos)
-        ]
+        _report_cache.clear()
+        limpar_cache_respostas()
+
+        if not confirmar_escrita:
+            # Com w=0 o servidor não confirma nem relata falhas: os documentos
+            # foram apenas enviados e as rejeições do banco não são conhecidas
+            logger.info(f"Upload concluído: {total_inseridos} autos de infração enviados sem confirmação")
+            return {
+                "message": "Upload enviado sem confirmação de escrita (w=0).",
+                "total_processados": total_inseridos + erros_processamento,
+                "total_enviados": total_inseridos,
+                "total_erros": erros_processamento,
+                "escrita_confirmada": False
+            }
+
+        logger.info(f"Upload concluído: {total_inseridos} autos de infração inseridos com sucesso")
+        return {
+            "message": "Upload realizado com sucesso!",
+            "total_processados": total_inseridos + erros_processamento,
+            "total_inseridos": total_inseridos,
+            "total_erros": erros_processamento + len(erros_escrita),
+            "escrita_confirmada": True,
+            "detalhes_erros_escrita": [
+                {"indice": erro.get("index"), "erro": erro.get("errmsg")}
+                for erro in erros_escrita[:5]
+            ]
+        }
 
     except HTTPException:
         raise
@@ -136,6 +187,25 @@ async def get_top_municipios_auto_infracao():
 
 
 
+def _render_top_municipios(municipios: list[str], totais: list[int]) -> bytes:
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    bars = ax.bar(municipios, totais, color="royalblue")
+    ax.set_title("Top 5 Municípios com Mais Autos de Infração")
+    ax.set_xlabel("Município")
+    ax.set_ylabel("Quantidade de Autos")
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+
+    # Adiciona os valores sobre as barras
+    for bar in bars:
+        yval = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, yval + 0.3, yval, ha='center', va='bottom')
+
+    buf = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(buf)
+    return buf.getvalue()
+
 @router.get("/stats/auto_infracao/top_municipios/plot")
 async def plot_top_municipios_auto_infracao():
     """
@@ -163,27 +233,8 @@ async def plot_top_municipios_auto_infracao():
         municipios = [item["municipio"] for item in stats]
         totais = [item["total"] for item in stats]
 
-        # Criar o gráfico
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(municipios, totais, color="royalblue")
-        plt.title("Top 5 Municípios com Mais Autos de Infração")
-        plt.xlabel("Município")
-        plt.ylabel("Quantidade de Autos")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        # Adiciona os valores sobre as barras
-        for bar in bars:
-            yval = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width() / 2, yval + 0.3, yval, ha='center', va='bottom')
-
-        # Envia como imagem PNG
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-
-        return StreamingResponse(buf, media_type="image/png")
+        png = await asyncio.to_thread(_render_top_municipios, municipios, totais)
+        return Response(content=png, media_type="image/png")
     except Exception as e:
         logger.error(f"Erro ao gerar gráfico de ranking de municípios: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -224,32 +275,59 @@ async def get_auto_infracao_by_bioma(bioma: str = Query(..., description="Nome d
 async def count_auto_infracao():
     logger.info("Contando total de autos de infração na coleção")
     try:
-        count = await auto_infracao_collection.count_documents({})
+        count = await auto_infracao_collection.estimated_document_count()
         logger.info(f"Total de autos de infração encontrados: {count}")
         return {"count": count}
     except Exception as e:
         logger.error(f"Erro ao contar autos de infração: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao contar documentos: {e}")
 
-@router.get("/get_by_date", response_model=list[AutoInfracaoOut])
+@router.get("/get_by_date", response_model=None)
 async def get_auto_infracao_by_date(data: str = Query(..., description="Formato: AAAA-MM-DD")):
+    """
+    Resumo (data, município, tipo e valor) dos autos de infração de um dia.
+    """
     logger.info(f"Buscando autos de infração por data: {data}")
     try:
-        # Converte a string para datetime (início do dia)
-        data_inicio = datetime.strptime(data, "%Y-%m-%d")
-        # Define o fim do dia (23h59m59s)
+        # Só a data (AAAA-MM-DD): janela de meia-noite a meia-noite, sem fuso,
+        # comparável com as datas BSON gravadas no upload
+        data_inicio = datetime.combine(date.fromisoformat(data), time.min)
         data_fim = data_inicio + timedelta(days=1)
 
-        documentos = await auto_infracao_collection.find({
-            "dat_hora_auto_infracao": {
-                "$gte": data_inicio,
-                "$lt": data_fim
-            }
-        }).to_list(length=None)
+        filtro = {"dat_hora_auto_infracao": {"$gte": data_inicio, "$lt": data_fim}}
 
-        logger.info(f"Encontrados {len(documentos)} autos de infração para a data {data}")
-        # Garante que o _id seja convertido para string se necessário
-        return [AutoInfracaoOut(**{**doc, "_id": str(doc["_id"])}) for doc in documentos]
+        async def documentos():
+            # O hint garante o plano coberto; sem o índice (migração não rodou) o
+            # servidor recusa o hint na primeira leitura e a busca segue sem ele
+            cursor = auto_infracao_collection.find(
+                filtro, projection=PROJECAO_POR_DATA, hint=INDICE_POR_DATA
+            ).batch_size(TAMANHO_LOTE_LEITURA)
+            try:
+                primeiro = await anext(cursor, None)
+            except OperationFailure as e:
+                logger.warning(f"Hint {INDICE_POR_DATA} recusado ({e}); busca por data sem hint")
+                cursor = auto_infracao_collection.find(
+                    filtro, projection=PROJECAO_POR_DATA
+                ).batch_size(TAMANHO_LOTE_LEITURA)
+                primeiro = await anext(cursor, None)
+            if primeiro is None:
+                return
+            yield primeiro
+            async for doc in cursor:
+                yield doc
+
+        # Serializa em fluxo: a memória fica limitada a um lote do cursor
+        async def gerar_json():
+            total = 0
+            yield b"["
+            async for doc in documentos():
+                doc["_id"] = str(doc["_id"])
+                yield (b"," if total else b"") + orjson.dumps(doc)
+                total += 1
+            yield b"]"
+            logger.info(f"Encontrados {total} autos de infração para a data {data}")
+
+        return StreamingResponse(gerar_json(), media_type="application/json")
 
     except ValueError:
         logger.warning(f"Formato de data inválido fornecido: {data}")
@@ -258,15 +336,69 @@ async def get_auto_infracao_by_date(data: str = Query(..., description="Formato:
         logger.error(f"Erro ao buscar autos de infração por data {data}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar documentos: {e}")
 
-@router.get("/auto_infracoes", response_model=PaginatedAutoInfracaoResponse)
-async def get_auto_infracoes(page: int = 1, page_size: int = 10):
-    logger.info(f"Buscando autos de infração - Página: {page}, Tamanho: {page_size}")
+@router.get("/auto_infracoes", response_model=None)
+async def get_auto_infracoes(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1),
+    after_ts: Optional[datetime] = Query(None, description="dat_hora_auto_infracao do último item da página anterior"),
+    after_id: Optional[str] = Query(None, description="_id do último item da página anterior")
+):
+    """
+    Lista autos de infração ordenados por data.
+    Com `after_ts` e `after_id` (retornados em `next`) a página é buscada por
+    faixa no índice, sem percorrer e descartar as páginas anteriores.
+    """
+    logger.info(f"Buscando autos de infração - Página: {page}, Tamanho: {page_size}, Após: {after_ts}/{after_id}")
     try:
-        total = await auto_infracao_collection.count_documents({})
-        items = await auto_infracao_collection.find().skip((page - 1) * page_size).limit(page_size).to_list(length=None)
-        
-        logger.info(f"Retornando {len(items)} autos de infração de um total de {total}")
-        return PaginatedAutoInfracaoResponse(total=total, page=page, size=page_size, items=items)
+        filtro = {}
+        if after_ts is not None and after_id is not None:
+            if not ObjectId.is_valid(after_id):
+                logger.warning(f"ID inválido fornecido como cursor: {after_id}")
+                raise HTTPException(status_code=400, detail="ID inválido")
+            filtro = {"$or": [
+                {"dat_hora_auto_infracao": {"$gt": after_ts}},
+                {"dat_hora_auto_infracao": after_ts, "_id": {"$gt": ObjectId(after_id)}}
+            ]}
+
+        # A contagem roda junto com a leitura da página e só é aguardada no fim
+        contagem = asyncio.ensure_future(auto_infracao_collection.estimated_document_count())
+
+        cursor = auto_infracao_collection.find(filtro, projection=PROJECAO_LEITURA).sort(ORDEM_PAGINACAO)
+        if not filtro:
+            cursor = cursor.skip((page - 1) * page_size)
+
+        cursor = cursor.limit(page_size).batch_size(min(page_size, TAMANHO_LOTE_LEITURA))
+
+        # Serializa em fluxo o mesmo envelope {page, size, items, total, next}:
+        # os itens são enviados conforme chegam do cursor, sem montar a página em memória
+        async def gerar_json():
+            try:
+                cabecalho = orjson.dumps({"page": page, "size": page_size})
+                yield cabecalho[:-1] + b',"items":['
+                enviados = 0
+                ultimo = None
+                async for doc in cursor:
+                    doc["_id"] = str(doc["_id"])
+                    yield (b"," if enviados else b"") + orjson.dumps(doc)
+                    enviados += 1
+                    ultimo = doc
+
+                next_cursor = None
+                if enviados == page_size:
+                    next_cursor = {
+                        "after_ts": ultimo["dat_hora_auto_infracao"],
+                        "after_id": ultimo["_id"]
+                    }
+                total = await contagem
+                yield b'],"total":' + orjson.dumps(total) + b',"next":' + orjson.dumps(next_cursor) + b"}"
+                logger.info(f"Retornados {enviados} autos de infração de um total de {total}")
+            finally:
+                # Cliente desconectado no meio do fluxo: a contagem não fica pendente
+                contagem.cancel()
+
+        return StreamingResponse(gerar_json(), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao buscar autos de infração paginados: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar documentos: {e}")
@@ -292,46 +424,158 @@ async def get_auto_by_id(id: str):
         logger.error(f"Erro ao buscar auto de infração por ID {id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar por id: {e}")
     
+def _render_auto_infracao_report(efeito_counts: pd.Series) -> bytes:
+    # API orientada a objetos: sem estado global do pyplot, seguro para rodar em threads
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot()
+    ax.bar(efeito_counts.index.astype(str), efeito_counts.values, color="skyblue")
+    ax.set_title("Distribuição dos Efeitos à Saúde Pública")
+    ax.set_xlabel("Efeito à Saúde Pública")
+    ax.set_ylabel("Quantidade")
+    ax.tick_params(axis="x", labelrotation=90)
+    fig.tight_layout()
+
+    img_bytes = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(img_bytes)
+    return img_bytes.getvalue()
+
 @router.get("/auto_infracao_report")
-async def get_auto_infracao_report():
+async def get_auto_infracao_report(request: Request):
     logger.info("Gerando relatório de distribuição dos efeitos à saúde pública")
     try:
-        cursor = auto_infracao_collection.find({})
-        data = await cursor.to_list(length=None)
-
-        if not data:
+        # Versão da coleção: muda quando entram novos autos
+        ultimo = await auto_infracao_collection.find_one(
+            sort=[("dat_hora_auto_infracao", -1)],
+            projection={"dat_hora_auto_infracao": 1}
+        )
+        if not ultimo:
             logger.warning("Nenhum dado encontrado para gerar o relatório")
             raise HTTPException(status_code=404, detail="Nenhum dado encontrado para gerar o relatório.")
 
-        logger.info(f"Processando relatório com {len(data)} registros")
-        df = pd.DataFrame(data)
-        if "efeito_saude_publica" not in df.columns:
-            logger.error("Coluna 'efeito_saude_publica' não encontrada nos dados")
-            raise HTTPException(status_code=400, detail="Coluna 'efeito_saude_publica' não encontrada.")
+        total = await auto_infracao_collection.estimated_document_count()
+        versao = f"{total}:{ultimo['dat_hora_auto_infracao'].isoformat()}"
+        etag = f'"{hashlib.md5(versao.encode()).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": f"max-age={REPORT_MAX_AGE}"}
 
-        efeito_counts = df["efeito_saude_publica"].value_counts()
-        logger.info(f"Distribuição dos efeitos: {dict(efeito_counts)}")
+        # Cliente já possui a versão atual do gráfico
+        if request.headers.get("if-none-match") == etag:
+            logger.info("Relatório não modificado (ETag)")
+            return Response(status_code=304, headers=headers)
 
-        plt.figure(figsize=(8, 6))
-        efeito_counts.plot(kind="bar", color="skyblue")
-        plt.title("Distribuição dos Efeitos à Saúde Pública")
-        plt.xlabel("Efeito à Saúde Pública")
-        plt.ylabel("Quantidade")
-        plt.tight_layout()
+        if versao in _report_cache:
+            logger.info("Relatório servido do cache")
+            return Response(content=_report_cache[versao], media_type="image/png", headers=headers)
 
-        img_bytes = io.BytesIO()
-        plt.savefig(img_bytes, format="png")
-        img_bytes.seek(0)
+        pipeline = [
+            {"$match": {"efeito_saude_publica": {"$ne": None}}},
+            {"$sortByCount": "$efeito_saude_publica"}
+        ]
+        counts = await auto_infracao_collection.aggregate(pipeline).to_list(None)
+
+        if not counts:
+            logger.warning("Nenhum dado encontrado para gerar o relatório")
+            raise HTTPException(status_code=404, detail="Nenhum dado encontrado para gerar o relatório.")
+
+        efeito_counts = pd.Series({c["_id"]: c["count"] for c in counts})
+        logger.info(f"Distribuição dos efeitos: {dict(efeito_counts)}")
+
+        png = await asyncio.to_thread(_render_auto_infracao_report, efeito_counts)
+        _report_cache.clear()
+        _report_cache[versao] = png
 
         logger.info("Relatório gráfico gerado com sucesso")
-        return StreamingResponse(img_bytes, media_type="image/png")
+        return Response(content=png, media_type="image/png", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Erro ao gerar relatório: {e}")
         raise HTTPException(status_code=500, detail="Erro ao gerar relatório.")
-    finally:
-        plt.close()
+
+def _geohash_cell(precision: int) -> tuple[float, float]:
+    """Altura e largura, em graus, de uma célula de geohash."""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+def _geohash_prefixos(longitude: float, latitude: float, radius: int) -> set[str]:
+    """
+    Célula que contém o ponto e suas 8 vizinhas, na maior precisão
+    cuja célula ainda é maior que o raio de busca.
+    """
+    precision = 1
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlon = _geohash_cell(p)
+        if dlat * 111320 >= radius and dlon * 111320 * math.cos(math.radians(latitude)) >= radius:
+            precision = p
+            break
+
+    dlat, dlon = _geohash_cell(precision)
+    return {
+        geohash_encode(
+            max(-90.0, min(90.0, latitude + i * dlat)),
+            (longitude + j * dlon + 180) % 360 - 180,
+            precision
+        )
+        for i in (-1, 0, 1)
+        for j in (-1, 0, 1)
+    }
+
+def _haversine(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distâncias, em metros, de um ponto a um vetor de pontos (Haversine vetorizado)."""
+    R = 6371000  # Raio da Terra em metros
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(lons - lon)
+
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+async def _nearby_por_geohash(longitude: float, latitude: float, radius: int) -> list[dict]:
+    """
+    Alternativa ao $geoNear quando não há índice 2dsphere: os candidatos vêm de
+    uma busca por prefixo no índice de geohash e a distância exata é calculada aqui.
+    """
+    prefixos = _geohash_prefixos(longitude, latitude, radius)
+    por_geohash = {"$or": [{"geohash": {"$regex": f"^{prefixo}"}} for prefixo in prefixos]}
+    # Autos gravados antes do geohash (sem o backfill do scripts/ensure_indexes.py)
+    # entram pela caixa de coordenadas ao redor do ponto
+    raio_lat = radius / 111320
+    raio_lon = raio_lat / max(math.cos(math.radians(latitude)), 1e-6)
+    por_caixa = {
+        "geohash": {"$exists": False},
+        "num_longitude": {"$gte": longitude - raio_lon, "$lte": longitude + raio_lon},
+        "num_latitude": {"$gte": latitude - raio_lat, "$lte": latitude + raio_lat}
+    }
+    # Só as coordenadas dos candidatos; o documento completo é lido apenas para o vencedor
+    projecao = {"_id": 1, "num_latitude": 1, "num_longitude": 1}
+    com_geohash, sem_geohash = await asyncio.gather(
+        auto_infracao_collection.find(por_geohash, projection=projecao).to_list(length=None),
+        auto_infracao_collection.find(por_caixa, projection=projecao).to_list(length=None)
+    )
+    candidatos = com_geohash + sem_geohash
+    logger.info(
+        f"Encontrados {len(com_geohash)} candidatos nas células de geohash {sorted(prefixos)} "
+        f"e {len(sem_geohash)} sem geohash na caixa de coordenadas"
+    )
+
+    if not candidatos:
+        return []
+
+    lats = np.fromiter((doc["num_latitude"] for doc in candidatos), dtype=np.float64, count=len(candidatos))
+    lons = np.fromiter((doc["num_longitude"] for doc in candidatos), dtype=np.float64, count=len(candidatos))
+    distancias = _haversine(latitude, longitude, lats, lons)
+    idx = int(np.argmin(distancias))
+    if distancias[idx] > radius:
+        return []
+
+    mais_proximo = await auto_infracao_collection.find_one(
+        {"_id": candidatos[idx]["_id"]}, projection=PROJECAO_LEITURA
+    )
+    if not mais_proximo:
+        return []
+    mais_proximo["distance"] = float(distancias[idx])
+    return [mais_proximo]
 
 @router.get("/auto_infracao/nearby")
 async def get_nearby_auto_infracao(
@@ -341,62 +585,29 @@ async def get_nearby_auto_infracao(
 ):
     logger.info(f"Buscando autos de infração próximos - Lat: {latitude}, Long: {longitude}, Raio: {radius}m")
     try:
-        # Converte metros para graus (aproximadamente)
-        # 1 grau ≈ 111,320 metros no equador
-        radius_degrees = radius / 111320
-        
-        query = {
-            "num_longitude": {
-                "$gte": longitude - radius_degrees,
-                "$lte": longitude + radius_degrees
-            },
-            "num_latitude": {
-                "$gte": latitude - radius_degrees,
-                "$lte": latitude + radius_degrees
-            }
-        }
-        
-        docs = await auto_infracao_collection.find(query).to_list(length=None)
+        pipeline = [
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": [longitude, latitude]},
+                "distanceField": "distance",
+                "maxDistance": radius,
+                "spherical": True
+            }},
+            {"$limit": 1}
+        ]
+        try:
+            docs = await auto_infracao_collection.aggregate(pipeline).to_list(1)
+        except OperationFailure as e:
+            logger.warning(f"$geoNear indisponível ({e}); usando prefiltro por geohash")
+            docs = await _nearby_por_geohash(longitude, latitude, radius)
+
         if not docs:
             logger.warning(f"Nenhum auto de infração encontrado próximo às coordenadas {latitude}, {longitude} dentro de {radius}m")
             raise HTTPException(404, "Nenhum auto de infração próximo encontrado dentro da distância especificada.")
-        
-        logger.info(f"Encontrados {len(docs)} autos de infração na área de busca inicial")
-        
-        def calculate_distance(lat1, lon1, lat2, lon2):
-            # Fórmula de Haversine para calcular distância entre coordenadas
-            R = 6371000  # Raio da Terra em metros
-            phi1 = math.radians(lat1)
-            phi2 = math.radians(lat2)
-            delta_phi = math.radians(lat2 - lat1)
-            delta_lambda = math.radians(lon2 - lon1)
-            
-            a = math.sin(delta_phi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            
-            return R * c
-        
-        results = []
-        for doc in docs:
-            if doc.get("num_latitude") and doc.get("num_longitude"):
-                distance = calculate_distance(
-                    latitude, longitude,
-                    doc["num_latitude"], doc["num_longitude"]
-                )
-                if distance <= radius:
-                    doc["distance"] = distance
-                    doc["_id"] = str(doc["_id"])
-                    results.append(doc)
-        
-        if not results:
-            logger.warning(f"Nenhum auto de infração dentro do raio exato de {radius}m após cálculo de distância")
-            raise HTTPException(404, "Nenhum auto de infração próximo encontrado dentro da distância especificada.")
-        
-        results.sort(key=lambda x: x["distance"])
-        closest = results[0]
-        closest_distance = closest.get("distance", 0)
-        closest.pop("distance", None)  
-        
+
+        closest = docs[0]
+        closest_distance = closest.pop("distance", 0)
+        closest["_id"] = str(closest["_id"])
+
         logger.info(f"Auto de infração mais próximo encontrado a {closest_distance:.2f}m de distância (ID: {closest['_id']})")
         return AutoInfracaoOut(**closest)
     except HTTPException:
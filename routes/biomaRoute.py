@@ -1,30 +1,44 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
-from database import bioma_collection
-from models.bioma import BiomaCreate, BiomaOut, PaginatedBiomaResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import Response
+from pymongo import WriteConcern
+from database import bioma_collection, inserir_em_lotes
+from models.bioma import BiomaCreate, BiomaOut, PaginatedBiomaResponse, PaginatedBiomasResponse
 from bson import ObjectId
 import pandas as pd
 import io
+import csv
 import math
-import numpy as np
-import matplotlib.pyplot as plt
-from typing import Optional
-from pydantic import BaseModel
+import asyncio
+import time
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from typing import List, Optional
+from pydantic import TypeAdapter, ValidationError
 from logs.logger import logger
 
-class PaginationMeta(BaseModel):
-    total_items: int
-    total_pages: int
-    current_page: int
-    limit: int
-
-class PaginatedBiomasResponse(BaseModel):
-    meta: PaginationMeta
-    data: List[BiomaOut]
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
 
 router = APIRouter(prefix="/biomas", tags=["Biomas"])
 
+# Upload confirma a escrita só no primário (w=1), sem esperar a replicação;
+# os erros de documentos rejeitados continuam sendo reportados
+_bioma_escrita = bioma_collection.with_options(write_concern=WriteConcern(w=1))
+
+TAMANHO_BLOCO_CSV = 10_000
+# Lotes de ~1000 documentos pequenos: bem abaixo dos limites do servidor
+# (100 mil operações / 16 MB por lote) e poucos o bastante para ocupar o pool em paralelo
+TAMANHO_LOTE = 1000
+TAMANHO_LOTE_LEITURA = 1000
+AMOSTRA_ERROS = 5
+# Abaixo deste tamanho (bytes) o CSV é lido com o módulo csv da biblioteca padrão
+LIMITE_CSV_PEQUENO = 1024 * 1024
+# Leitura pelo Arrow é dividida em blocos de bytes, não de linhas
+TAMANHO_BLOCO_ARROW = 4 * 1024 * 1024
+
 COLUNA_BIOMAS = {
     "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
     "NUM_AUTO_INFRACAO": "num_auto_infracao",
@@ -36,163 +50,381 @@ COLUNA_BIOMAS = {
 def normalize_column_name(column_name: str) -> str:
     return column_name.strip().lower().replace(" ", "_")
 
-@router.post("/upload/biomas")
-async def upload_biomas(file: UploadFile = File(...)):
-    logger.info(f"Iniciando upload de arquivo CSV de biomas: {file.filename}")
+# Validação em lote (uma chamada ao pydantic-core para o bloco inteiro)
+_BIOMAS_ADAPTER = TypeAdapter(list[BiomaCreate])
+
+# Resumo estatístico: reaproveitado por RELATORIO_TTL_SEGUNDOS e descartado a cada upload
+RELATORIO_TTL_SEGUNDOS = 60
+_cache_relatorios: dict[str, tuple[float, object]] = {}
+
+# Gráfico (PNG) do relatório, indexado pela versão da coleção (total de documentos);
+# só a versão mais recente é mantida
+_report_cache: dict[str, bytes] = {}
+REPORT_MAX_AGE = 60
+
+# Mesma collation do índice idx_bioma_bioma_ci: o filtro por nome é uma igualdade
+# sem diferenciar maiúsculas/minúsculas, resolvida pelo índice (regex varreria a coleção)
+COLLATION_BIOMA = {"locale": "pt", "strength": 2}
+
+# Somente os campos de BiomaOut (o _id vem por padrão)
+PROJECAO_BIOMA = {model_col: 1 for model_col in COLUNA_BIOMAS.values()}
+
+# Campos do modelo, na ordem em que o BiomaCreate os serializa
+_CAMPOS_BIOMA_ORDEM = tuple(COLUNA_BIOMAS.values())
+_CAMPOS_BIOMA = frozenset(_CAMPOS_BIOMA_ORDEM)
+_CAMPOS_INTEIROS = ("seq_auto_infracao", "num_auto_infracao")
+FORMATO_DATA_BIOMA = "%Y-%m-%d %H:%M:%S"
+
+# Pares (coluna do CSV, campo do modelo), calculados uma vez na carga do módulo
+_PARES_COLUNAS = tuple(COLUNA_BIOMAS.items())
+_COLUNAS_ESPERADAS = frozenset(COLUNA_BIOMAS)
+
+def _colunas_presentes(colunas) -> tuple[list[str], list[str]]:
+    """
+    Colunas do CSV reconhecidas e os respectivos nomes no modelo, em uma única passada.
+    """
+    colunas = list(colunas)
+    # Interseção de conjuntos: custo linear mesmo em CSVs com centenas de colunas
+    reconhecidas = _COLUNAS_ESPERADAS.intersection(colunas)
+    csv_cols = [csv_col for csv_col, _ in _PARES_COLUNAS if csv_col in reconhecidas]
+    model_cols = [COLUNA_BIOMAS[csv_col] for csv_col in csv_cols]
+
+    if not csv_cols:
+        logger.error("Nenhuma coluna válida encontrada. Disponíveis: %s", colunas)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nenhuma coluna válida encontrada no CSV. Colunas disponíveis: {colunas}. Colunas esperadas: {list(COLUNA_BIOMAS.keys())}"
+        )
+    return csv_cols, model_cols
+
+def _blocos_biomas_pequeno(arquivo):
+    """
+    Arquivos pequenos: csv.DictReader em um único bloco, sem o custo fixo de
+    montar DataFrame/tabela Arrow para poucas linhas.
+    """
+    # utf-8-sig descarta o BOM, como fazem os leitores do pandas e do pyarrow
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
     try:
-        df = pd.read_csv(
-            io.BytesIO(await file.read()),
+        leitor = csv.DictReader(texto, delimiter=";")
+        pares = list(zip(*_colunas_presentes(leitor.fieldnames or [])))
+        yield [
+            {model_col: row[csv_col] or None for csv_col, model_col in pares}
+            for row in leitor
+        ]
+    finally:
+        # Devolve o arquivo do upload sem fechá-lo junto com o wrapper
+        texto.detach()
+
+def _blocos_biomas(arquivo):
+    """
+    Lê o CSV de biomas em blocos e produz, para cada bloco, um DataFrame com as
+    colunas renomeadas e vazios como None. Usa o leitor multi-thread do pyarrow
+    quando instalado; senão, o pandas com chunksize.
+    """
+    if pacsv is None:
+        leitor = pd.read_csv(
+            arquivo,
             sep=";",
             encoding="utf-8",
             dtype=str,  # Força tudo como string inicialmente
             keep_default_na=False,  # Não converte valores vazios para NaN
-            na_values=['']  # Trata apenas strings vazias como NA
+            na_values=[''],  # Trata apenas strings vazias como NA
+            chunksize=TAMANHO_BLOCO_CSV
         )
-        
-        logger.info(f"Arquivo CSV carregado com {len(df)} linhas")
+        presentes = None
+        for df in leitor:
+            if presentes is None:
+                presentes = _colunas_presentes(df.columns)
 
-        rename_map = {
-            csv_col: model_col
-            for csv_col, model_col in COLUNA_BIOMAS.items()
-            if csv_col in df.columns
-        }
-        
-        if not rename_map:
-            available_columns = list(df.columns)
-            logger.error(f"Nenhuma coluna válida encontrada. Disponíveis: {available_columns}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Nenhuma coluna válida encontrada no CSV. Colunas disponíveis: {available_columns}. Colunas esperadas: {list(COLUNA_BIOMAS.keys())}"
-            )
-            
-        df = df[list(rename_map.keys())].rename(columns=rename_map)
+            csv_cols, model_cols = presentes
+            df = df[csv_cols].set_axis(model_cols, axis=1)
+            # Colunas são todas texto (object): uma máscara vetorizada troca NaN/'' por None
+            yield df.mask(df.isna() | (df == ''), other=None)
+        return
 
-        df = df.replace({np.nan: None, '': None})
-        
-        registros = []
-        registros_com_erro = []
-        
-        for index, row in df.iterrows():
-            try:
-                registro_dict = row.to_dict()
-                
-                # O modelo Pydantic agora cuida da conversão de tipos
-                bioma = BiomaCreate(**registro_dict)
-                registros.append(bioma.model_dump())
-                
-            except Exception as e:
-                erro_info = {
-                    "linha": index + 1,
-                    "dados": row.to_dict(),
-                    "erro": str(e)
-                }
-                registros_com_erro.append(erro_info)
-                logger.warning(f"Erro ao processar linha {index + 1}: {registro_dict} | Erro: {e}")
-                continue
-        
-        if not registros:
-            logger.error(f"Nenhum registro válido encontrado. Total de erros: {len(registros_com_erro)}")
+    # Texto puro e vazios como nulos: a conversão de tipos fica com o modelo
+    leitor = pacsv.open_csv(
+        arquivo,
+        read_options=pacsv.ReadOptions(block_size=TAMANHO_BLOCO_ARROW),
+        parse_options=pacsv.ParseOptions(delimiter=";"),
+        convert_options=pacsv.ConvertOptions(
+            column_types={col: pa.string() for col in COLUNA_BIOMAS},
+            null_values=[""],
+            strings_can_be_null=True
+        )
+    )
+    csv_cols, model_cols = _colunas_presentes(leitor.schema.names)
+    for lote in leitor:
+        tabela = pa.Table.from_batches([lote]).select(csv_cols).rename_columns(model_cols)
+        # Colunas de texto do Arrow viram object no pandas, com None nos nulos
+        yield tabela.to_pandas()
+
+def _obter_do_cache(chave: str):
+    em_cache = _cache_relatorios.get(chave)
+    if em_cache and time.monotonic() - em_cache[0] < RELATORIO_TTL_SEGUNDOS:
+        return em_cache[1]
+    return None
+
+def _guardar_em_cache(chave: str, valor) -> None:
+    _cache_relatorios[chave] = (time.monotonic(), valor)
+
+# Nomes de saída (aliases) de BiomaOut, como o FastAPI serializaria o modelo
+_ALIASES_BIOMA = tuple(
+    (nome, campo.alias or nome)
+    for nome, campo in BiomaOut.model_fields.items()
+    if nome != "id"
+)
+
+def _bioma_json(doc: dict) -> dict:
+    """
+    Documento do banco já no formato de resposta de BiomaOut, serializado
+    diretamente pelo ORJSONResponse nas listagens e na busca por ID, sem passar pelo modelo.
+    """
+    return {"_id": str(doc["_id"]), **{alias: doc.get(nome) for nome, alias in _ALIASES_BIOMA}}
+
+def _documentos(biomas: list[BiomaCreate]) -> list[dict]:
+    # Campos já validados e sem modelos aninhados: uma cópia rasa do __dict__ serve
+    # como documento (o insert_many grava _id nela, não no modelo), sem o dump_python
+    return [dict(bioma.__dict__) for bioma in biomas]
+
+def _validar_biomas(registros_csv: list[dict], linhas) -> tuple[list[dict], list[dict]]:
+    # O modelo Pydantic cuida da conversão de tipos, validando o bloco em uma única chamada
+    try:
+        return _documentos(_BIOMAS_ADAPTER.validate_python(registros_csv)), []
+    except ValidationError as e:
+        invalidos = {erro["loc"][0] for erro in e.errors()}
+
+    # Só as linhas rejeitadas são revalidadas uma a uma, para detalhar o erro
+    validos = [registro for i, registro in enumerate(registros_csv) if i not in invalidos]
+    registros = _documentos(_BIOMAS_ADAPTER.validate_python(validos))
+    registros_com_erro = []
+    for i in sorted(invalidos):
+        linha, registro_dict = linhas[i], registros_csv[i]
+        try:
+            BiomaCreate(**registro_dict)
+        except Exception as e:
+            erro_info = {
+                "linha": linha,
+                "dados": registro_dict,
+                "erro": str(e)
+            }
+            registros_com_erro.append(erro_info)
+            logger.warning("Erro ao processar linha %s: %s | Erro: %s", linha, registro_dict, e)
+    return registros, registros_com_erro
+
+def _preparar_biomas(df: pd.DataFrame, primeira_linha: int) -> tuple[list[dict], list[dict]]:
+    """
+    Conversão de tipos vetorizada do bloco. Só as linhas que fogem do formato
+    esperado (inteiros sem sinal, data AAAA-MM-DD HH:MM:SS) passam pelo modelo,
+    que decide se são aceitas e detalha o erro.
+    """
+    linhas = range(primeira_linha, primeira_linha + len(df))
+    # Coluna ausente no CSV: o modelo rejeita todas as linhas, com a mensagem dele
+    if not _CAMPOS_BIOMA.issubset(df.columns):
+        return _validar_biomas(df.to_dict(orient="records"), linhas)
+
+    # Até 15 dígitos: a conversão via float do to_numeric continua exata
+    inteiros_ok = [
+        df[col].isna() | df[col].str.fullmatch(r"\d{1,15}", na=False)
+        for col in _CAMPOS_INTEIROS
+    ]
+    datas = pd.to_datetime(df["ultima_atualizacao"], format=FORMATO_DATA_BIOMA, errors="coerce")
+    aceitos = (df["bioma"].notna() & datas.notna()).to_numpy()
+    for ok in inteiros_ok:
+        aceitos &= ok.to_numpy()
+
+    validos = df.loc[aceitos, list(_CAMPOS_BIOMA_ORDEM)].copy()
+    for col in _CAMPOS_INTEIROS:
+        valores = pd.to_numeric(validos[col]).astype("Int64")
+        validos[col] = valores.astype(object).where(valores.notna(), None)
+    validos["ultima_atualizacao"] = datas[aceitos]
+    registros = validos.to_dict(orient="records")
+
+    if aceitos.all():
+        return registros, []
+    rejeitados = df.loc[~aceitos]
+    registros_modelo, registros_com_erro = _validar_biomas(
+        rejeitados.to_dict(orient="records"),
+        [linhas[i] for i in (~aceitos).nonzero()[0]]
+    )
+    return registros + registros_modelo, registros_com_erro
+
+def _proximo_bloco_biomas(leitor, primeira_linha: int) -> Optional[tuple[int, list[dict], list[dict]]]:
+    bloco = next(leitor, None)
+    if bloco is None:
+        return None
+    if isinstance(bloco, pd.DataFrame):
+        return len(bloco), *_preparar_biomas(bloco, primeira_linha)
+    # Arquivos pequenos (lista de dicts) vão direto ao modelo
+    return len(bloco), *_validar_biomas(bloco, range(primeira_linha, primeira_linha + len(bloco)))
+
+@router.post("/upload/biomas")
+async def upload_biomas(file: UploadFile = File(...)):
+    logger.info("Iniciando upload de arquivo CSV de biomas: %s", file.filename)
+    try:
+        total_processados = 0
+        total_inseridos = 0
+        # Só uma amostra dos erros é devolvida: o restante entra apenas na contagem
+        total_erros_processamento = 0
+        total_erros_escrita = 0
+        amostra_erros = []
+        amostra_erros_escrita = []
+
+        # Um bloco por vez: a memória fica limitada ao tamanho do bloco
+        if file.size is not None and file.size <= LIMITE_CSV_PEQUENO:
+            leitor = _blocos_biomas_pequeno(file.file)
+        else:
+            leitor = _blocos_biomas(file.file)
+        tarefa = asyncio.ensure_future(asyncio.to_thread(_proximo_bloco_biomas, leitor, 1))
+        try:
+            while (bloco := await tarefa) is not None:
+                lidos, registros, erros_bloco = bloco
+                total_processados += lidos
+                # O próximo bloco é lido e validado enquanto o atual é inserido
+                tarefa = asyncio.ensure_future(
+                    asyncio.to_thread(_proximo_bloco_biomas, leitor, total_processados + 1)
+                )
+                total_erros_processamento += len(erros_bloco)
+                amostra_erros.extend(erros_bloco[:AMOSTRA_ERROS - len(amostra_erros)])
+
+                if registros:
+                    logger.info("Processando inserção de %s biomas válidos", len(registros))
+                    inseridos, erros_lote = await inserir_em_lotes(_bioma_escrita, registros, TAMANHO_LOTE)
+                    total_inseridos += inseridos
+                    total_erros_escrita += len(erros_lote)
+                    amostra_erros_escrita.extend(erros_lote[:AMOSTRA_ERROS - len(amostra_erros_escrita)])
+        finally:
+            # Leitura antecipada pendente (inserção falhou) não fica órfã
+            tarefa.cancel()
+
+        logger.info("Arquivo CSV processado com %s linhas", total_processados)
+        if total_erros_escrita:
+            logger.warning("Total de %s biomas rejeitados pelo banco", total_erros_escrita)
+
+        if not total_inseridos:
+            logger.error("Nenhum registro válido encontrado. Total de erros: %s", total_erros_processamento)
             raise HTTPException(
                 status_code=400, 
-                detail=f"Nenhum registro válido foi encontrado no CSV. Total de erros: {len(registros_com_erro)}"
+                detail=f"Nenhum registro válido foi encontrado no CSV. Total de erros: {total_erros_processamento}"
             )
         
-        logger.info(f"Processando inserção de {len(registros)} biomas válidos")
-        resultado = await bioma_collection.insert_many(registros)
-        
-        logger.info(f"Upload concluído: {len(resultado.inserted_ids)} biomas inseridos com sucesso")
+        # Novos biomas invalidam o gráfico e o resumo em cache
+        _cache_relatorios.clear()
+        _report_cache.clear()
+
+        logger.info("Upload concluído: %s biomas inseridos com sucesso", total_inseridos)
         return {
             "message": "Upload realizado com sucesso!",
-            "total_processados": len(df),
-            "total_inseridos": len(resultado.inserted_ids),
-            "total_erros": len(registros_com_erro),
-            "detalhes_erros": registros_com_erro[:5] if registros_com_erro else [] 
+            "total_processados": total_processados,
+            "total_inseridos": total_inseridos,
+            "total_erros": total_erros_processamento + total_erros_escrita,
+            "detalhes_erros": amostra_erros,
+            "detalhes_erros_escrita": [
+                {"indice": erro.get("index"), "erro": erro.get("errmsg")}
+                for erro in amostra_erros_escrita
+            ]
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro interno no upload de biomas: {str(e)}")
+        logger.error("Erro interno no upload de biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
     
-@router.get("get_by_bioma", response_model=List[BiomaOut])
-async def get_biomas_by_bioma(bioma: Optional[str] = Query(None, description="Filtrar por nome do bioma")):
+@router.get("get_by_bioma", response_model=None, responses={200: {"model": List[BiomaOut]}})
+async def get_biomas_by_bioma(bioma: Optional[str] = Query(None, description="Filtrar por nome do bioma (exato, sem diferenciar maiúsculas/minúsculas)")):
     """
     Buscar biomas por nome.
     Se nenhum bioma for fornecido, retorna todos os biomas.
     """
-    logger.info(f"Buscando biomas por nome: {bioma}")
+    logger.info("Buscando biomas por nome: %s", bioma)
     try:
         query = {}
         if bioma:
-            query["bioma"] = {"$regex": bioma, "$options": "i"}
-            logger.info(f"Aplicando filtro por bioma: {bioma}")
+            query["bioma"] = bioma
+            logger.debug("Aplicando filtro por bioma: %s", bioma)
 
-        biomas = await bioma_collection.find(query).to_list(length=None)
+        cursor = bioma_collection.find(
+            query, PROJECAO_BIOMA, collation=COLLATION_BIOMA if bioma else None
+        ).batch_size(TAMANHO_LOTE_LEITURA)
+        items = [_bioma_json(doc) async for doc in cursor]
 
-        if not biomas:
+        if not items:
             logger.warning("Nenhum bioma encontrado com o filtro fornecido")
             raise HTTPException(status_code=404, detail="Nenhum bioma encontrado")
 
-        def serialize(doc):
-            doc["_id"] = str(doc["_id"])
-            return doc
-
-        items = [BiomaOut(**serialize(doc)) for doc in biomas]
-        logger.info(f"Total de biomas encontrados: {len(items)}")
+        logger.info("Total de biomas encontrados: %s", len(items))
         return items
 
     except Exception as e:
-        logger.error(f"Erro ao buscar biomas: {e}")
+        logger.error("Erro ao buscar biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar documentos: {e}")
 
-@router.get("/biomas", response_model=PaginatedBiomaResponse)
-async def get_biomas(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1)):
-    logger.info(f"Buscando biomas - Página: {page}, Tamanho: {page_size}")
+def _pagina_por_id(query: dict, after: Optional[str]) -> dict:
+    """
+    Acrescenta ao filtro a continuação por faixa de _id: a página seguinte é
+    buscada direto no índice de _id, sem percorrer e descartar as anteriores.
+    """
+    if not after:
+        return query
+    if not ObjectId.is_valid(after):
+        logger.warning("ID inválido fornecido como cursor: %s", after)
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {**query, "_id": {"$gt": ObjectId(after)}}
+
+@router.get("/biomas", response_model=None, responses={200: {"model": PaginatedBiomaResponse}})
+async def get_biomas(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1),
+    after: Optional[str] = Query(None, description="_id do último item da página anterior (next_cursor)")
+):
+    logger.info("Buscando biomas - Página: %s, Tamanho: %s, Após: %s", page, page_size, after)
     try:
-        skip = (page - 1) * page_size
-        total = await bioma_collection.count_documents({})
-        biomas = await bioma_collection.find({}).skip(skip).limit(page_size).to_list(length=page_size)
-
-        def serialize(doc):
-            doc["_id"] = str(doc["_id"])
-            return doc
-
-        items = [BiomaOut(**serialize(doc)) for doc in biomas]
-
-        logger.info(f"Retornando {len(items)} biomas de um total de {total}")
-        return PaginatedBiomaResponse(
-            total=total,
-            page=page,
-            size=page_size,
-            items=items
-        )
+        total = await bioma_collection.estimated_document_count()
+        cursor = bioma_collection.find(_pagina_por_id({}, after), PROJECAO_BIOMA).sort("_id", 1)
+        if not after:
+            cursor = cursor.skip((page - 1) * page_size)
+        # Página inteira em um único lote (limitado a TAMANHO_LOTE_LEITURA)
+        cursor = cursor.limit(page_size).batch_size(min(page_size, TAMANHO_LOTE_LEITURA))
 
+        # Cada documento é convertido assim que chega, sem montar antes a lista bruta
+        items = [_bioma_json(doc) async for doc in cursor]
+
+        logger.info("Retornando %s biomas de um total de %s", len(items), total)
+        return {
+            "total": total,
+            "page": page,
+            "size": page_size,
+            "items": items,
+            "next_cursor": items[-1]["_id"] if len(items) == page_size else None
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erro ao buscar biomas: {e}")
+        logger.error("Erro ao buscar biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar documentos: {e}")
 
-@router.get("/biomas/{bioma_id}", response_model=BiomaOut)
+@router.get("/biomas/{bioma_id}", response_model=None, responses={200: {"model": BiomaOut}})
 async def obter_bioma(bioma_id: str):
     """Obter um bioma específico pelo ID"""
-    logger.info(f"Buscando bioma por ID: {bioma_id}")
+    logger.debug("Buscando bioma por ID: %s", bioma_id)
     try:
         if not ObjectId.is_valid(bioma_id):
-            logger.warning(f"ID inválido fornecido: {bioma_id}")
+            logger.warning("ID inválido fornecido: %s", bioma_id)
             raise HTTPException(status_code=400, detail="ID inválido")
         
-        bioma = await bioma_collection.find_one({"_id": ObjectId(bioma_id)})
+        bioma = await bioma_collection.find_one({"_id": ObjectId(bioma_id)}, PROJECAO_BIOMA)
         if not bioma:
-            logger.warning(f"Bioma não encontrado para ID: {bioma_id}")
+            logger.warning("Bioma não encontrado para ID: %s", bioma_id)
             raise HTTPException(status_code=404, detail="Bioma não encontrado")
         
-        bioma["_id"] = str(bioma["_id"])
-        logger.info(f"Bioma encontrado: {bioma.get('bioma', 'N/A')} (ID: {bioma_id})")
-        return BiomaOut(**bioma)
+        logger.debug("Bioma encontrado: %s (ID: %s)", bioma.get('bioma', 'N/A'), bioma_id)
+        return _bioma_json(bioma)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao buscar bioma por ID {bioma_id}: {str(e)}")
+        logger.error("Erro ao buscar bioma por ID %s: %s", bioma_id, e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar bioma: {str(e)}")
 
 @router.get("/biomas/stats/contagem")
@@ -200,56 +432,77 @@ async def contar_biomas():
     """Contar total de biomas na base"""
     logger.info("Contando total de biomas na coleção")
     try:
-        total = await bioma_collection.count_documents({})
-        logger.info(f"Total de biomas encontrados: {total}")
+        total = await bioma_collection.estimated_document_count()
+        logger.info("Total de biomas encontrados: %s", total)
         return {"total_biomas": total}
     except Exception as e:
-        logger.error(f"Erro ao contar biomas: {str(e)}")
+        logger.error("Erro ao contar biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao contar biomas: {str(e)}")
     
+def _render_biomas_report(biomas: list[str], totais: list[int]) -> bytes:
+    # API orientada a objetos: sem estado global do pyplot nem plt.close()
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.bar(biomas, totais, color='skyblue')
+    ax.set_xlabel('Bioma')
+    ax.set_ylabel('Número de Infrações')
+    ax.set_title('Número de Infrações por Bioma')
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+
+    img_bytes = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(img_bytes)
+    return img_bytes.getvalue()
+
 @router.get("/biomas_report")
-async def get_biomas_report():
+async def get_biomas_report(request: Request):
     """
     Gera um relatório de insights sobre os biomas, incluindo um gráfico.
     """
     logger.info("Gerando relatório de biomas com gráfico")
     try:
-        cursor = bioma_collection.find({})
-        data = await cursor.to_list(length=None)
-        
-        if not data:
+        # Versão da coleção: muda quando entram novos biomas (leitura de metadados)
+        versao = str(await bioma_collection.estimated_document_count())
+        etag = f'"biomas-{versao}"'
+        headers = {"ETag": etag, "Cache-Control": f"max-age={REPORT_MAX_AGE}"}
+
+        # Cliente já possui a versão atual do gráfico
+        if request.headers.get("if-none-match") == etag:
+            logger.info("Relatório de biomas não modificado (ETag)")
+            return Response(status_code=304, headers=headers)
+
+        if versao in _report_cache:
+            logger.info("Relatório de biomas servido do cache")
+            return Response(content=_report_cache[versao], media_type="image/png", headers=headers)
+
+        # Insights: Contagem de infrações por bioma, agrupada no próprio banco
+        pipeline = [
+            {"$group": {"_id": "$bioma", "total_infracoes": {"$sum": 1}}},
+            {"$sort": {"total_infracoes": -1}}
+        ]
+        infracoes_por_bioma = await bioma_collection.aggregate(pipeline).to_list(None)
+
+        if not infracoes_por_bioma:
             logger.warning("Nenhum dado de bioma encontrado para gerar relatório")
             raise HTTPException(status_code=404, detail="Nenhum dado de bioma encontrado para gerar relatório.")
 
-        df = pd.DataFrame(data)
-        logger.info(f"Dados carregados para relatório: {len(df)} registros")
-
-        # Insights: Contagem de infrações por bioma
-        infracoes_por_bioma = df['bioma'].value_counts().reset_index()
-        infracoes_por_bioma.columns = ['bioma', 'total_infracoes']
+        biomas = [str(item["_id"]) for item in infracoes_por_bioma]
+        totais = [item["total_infracoes"] for item in infracoes_por_bioma]
+        logger.info("Dados carregados para relatório: %s registros em %s biomas", sum(totais), len(biomas))
 
         # Gerar gráfico
-        plt.figure(figsize=(10, 6))
-        plt.bar(infracoes_por_bioma['bioma'], infracoes_por_bioma['total_infracoes'], color='skyblue')
-        plt.xlabel('Bioma')
-        plt.ylabel('Número de Infrações')
-        plt.title('Número de Infrações por Bioma')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        img_bytes = io.BytesIO()
-        plt.savefig(img_bytes, format='png')
-        img_bytes.seek(0)
+        # Renderização é CPU-bound: roda fora do event loop
+        png = await asyncio.to_thread(_render_biomas_report, biomas, totais)
+        _report_cache.clear()
+        _report_cache[versao] = png
 
         logger.info("Relatório de biomas gerado com sucesso")
-        return StreamingResponse(img_bytes, media_type="image/png")
+        return Response(content=png, media_type="image/png", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao gerar relatório de biomas: {str(e)}")
+        logger.error("Erro ao gerar relatório de biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de insights: {str(e)}")
-    finally:
-        plt.close()
 
 
 @router.get("/stats/summary")
@@ -259,6 +512,11 @@ async def get_bioma_stats():
     """
     logger.info("Gerando estatísticas resumidas de biomas")
     try:
+        resumo = _obter_do_cache("stats_summary")
+        if resumo is not None:
+            logger.info("Estatísticas de biomas servidas do cache")
+            return resumo
+
         pipeline = [
             {
                 "$group": {
@@ -277,52 +535,66 @@ async def get_bioma_stats():
         
         stats = await bioma_collection.aggregate(pipeline).to_list(None)
         
-        logger.info(f"Estatísticas geradas para {len(stats)} tipos de biomas")
-        return {
+        logger.info("Estatísticas geradas para %s tipos de biomas", len(stats))
+        resumo = {
             "estatisticas_por_bioma": stats
         }
+        _guardar_em_cache("stats_summary", resumo)
+        return resumo
     except Exception as e:
-        logger.error(f"Erro ao gerar estatísticas de biomas: {str(e)}")
+        logger.error("Erro ao gerar estatísticas de biomas: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=PaginatedBiomasResponse)
+@router.get("/", response_model=None, responses={200: {"model": PaginatedBiomasResponse}})
 async def listar_biomas(
-    bioma: Optional[str] = Query(None, description="Filtrar por nome do bioma"),
-    skip: int = Query(0, ge=0, description="Número de registros a pular"),
-    limit: int = Query(10, ge=1, le=200, description="Número de registros por página")
+    bioma: Optional[str] = Query(None, description="Filtrar por nome do bioma (exato, sem diferenciar maiúsculas/minúsculas)"),
+    skip: int = Query(0, ge=0, description="Número de registros a pular (ignorado quando `after` é informado)"),
+    limit: int = Query(10, ge=1, le=200, description="Número de registros por página"),
+    after: Optional[str] = Query(None, description="_id do último item da página anterior (meta.next_cursor)")
 ):
     """
     Listar biomas com metadados de paginação e filtros.
     """
-    logger.info(f"Listando biomas - Filtro: {bioma}, Skip: {skip}, Limit: {limit}")
+    logger.info("Listando biomas - Filtro: %s, Skip: %s, Limit: %s, Após: %s", bioma, skip, limit, after)
     try:
         query = {}
         if bioma:
-            query["bioma"] = {"$regex": bioma, "$options": "i"}
-            logger.info(f"Aplicando filtro por bioma: {bioma}")
+            query["bioma"] = bioma
+            logger.debug("Aplicando filtro por bioma: %s", bioma)
+        collation = COLLATION_BIOMA if bioma else None
 
-        total_items = await bioma_collection.count_documents(query)
+        # Sem filtro, o total vem dos metadados da coleção; a contagem exata só com filtro
+        if query:
+            total_items = await bioma_collection.count_documents(query, collation=collation)
+        else:
+            total_items = await bioma_collection.estimated_document_count()
         total_pages = math.ceil(total_items / limit)
         current_page = (skip // limit) + 1
 
-        cursor = bioma_collection.find(query).skip(skip).limit(limit)
+        cursor = bioma_collection.find(_pagina_por_id(query, after), PROJECAO_BIOMA, collation=collation).sort("_id", 1)
+        if not after:
+            cursor = cursor.skip(skip)
+        cursor = cursor.limit(limit).batch_size(limit)
         
         biomas_list = [
-            BiomaOut(**{**doc, "_id": str(doc["_id"])}) 
+            _bioma_json(doc)
             async for doc in cursor
         ]
 
-        logger.info(f"Retornando {len(biomas_list)} biomas (página {current_page} de {total_pages})")
-        return PaginatedBiomasResponse(
-            meta=PaginationMeta(
-                total_items=total_items,
-                total_pages=total_pages,
-                current_page=current_page,
-                limit=limit
-            ),
-            data=biomas_list
-        )
+        logger.info("Retornando %s biomas (página %s de %s)", len(biomas_list), current_page, total_pages)
+        return {
+            "meta": {
+                "total_items": total_items,
+                "total_pages": total_pages,
+                "current_page": current_page,
+                "limit": limit,
+                "next_cursor": biomas_list[-1]["_id"] if len(biomas_list) == limit else None
+            },
+            "data": biomas_list
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erro ao listar biomas: {str(e)}")
+        logger.error("Erro ao listar biomas: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao buscar biomas: {str(e)}")
\ No newline at end of file
@@ -1,29 +1,197 @@
-import traceback
-from bson import ObjectId
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
-from fastapi.responses import StreamingResponse
-from database import auto_infracao_collection, especime_collection, enquadramento_collection, bioma_collection
-import matplotlib.pyplot as plt
-import pandas as pd
-import io
+import asyncio
+import time
+import orjson
+from bson import ObjectId, json_util
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from pymongo.errors import OperationFailure
+from database import auto_infracao_collection, enquadramento_collection
+from cache import guardar_resposta, resposta_em_cache
 from datetime import datetime, timedelta
-import math
-from logs.logger import logger
-from typing import List, Dict, Any
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional, List
-from datetime import datetime
-from database import auto_infracao_collection, bioma_collection
+from typing import Optional, Dict, Any
 from logs.logger import logger
 
 from models.auto_infracao import AutoInfracaoOut
-from models.bioma import BiomaOut
 from models.especime import EspecimeOut
 
 router = APIRouter()
 
-@router.get("/auto-infracao-enquadramento/{seq_auto_infracao}")
+def _dumps_bson(content: Any) -> bytes:
+    """
+    Serializa com orjson convertendo ObjectId (e outros tipos BSON sem
+    equivalente JSON) com str durante a própria serialização.
+    """
+    return orjson.dumps(
+        content,
+        default=str,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+class _RespostaBSON(ORJSONResponse):
+    """
+    ORJSONResponse que serializa com _dumps_bson, dispensando os laços que
+    convertiam cada _id antes de responder.
+    """
+    def render(self, content: Any) -> bytes:
+        return _dumps_bson(content)
+
+# Cache curto das contagens filtradas: o "total" da paginação não precisa ser
+# exato a cada requisição, e evita repetir o $count a cada página navegada
+CONTAGEM_TTL_SEGUNDOS = 30
+CONTAGEM_CACHE_MAX = 1024
+_contagem_cache: dict[str, tuple[float, int]] = {}
+
+async def _contar_com_cache(count_pipeline: list[dict]) -> int:
+    """
+    Executa o pipeline de contagem (terminado em $count "total"), reaproveitando
+    o resultado por CONTAGEM_TTL_SEGUNDOS para o mesmo pipeline.
+    """
+    chave = json_util.dumps(count_pipeline)
+    agora = time.monotonic()
+    em_cache = _contagem_cache.get(chave)
+    if em_cache and agora - em_cache[0] < CONTAGEM_TTL_SEGUNDOS:
+        return em_cache[1]
+
+    count_result = await auto_infracao_collection.aggregate(count_pipeline).to_list(1)
+    total = count_result[0]["total"] if count_result else 0
+    # Filtros livres geram chaves sem fim: no máximo CONTAGEM_CACHE_MAX entradas (sai a mais antiga)
+    _contagem_cache.pop(chave, None)
+    _contagem_cache[chave] = (agora, total)
+    if len(_contagem_cache) > CONTAGEM_CACHE_MAX:
+        del _contagem_cache[next(iter(_contagem_cache))]
+    return total
+
+async def _agregar_com_hint(pipeline: list[dict], hint: Optional[str], length: Optional[int]) -> list[dict]:
+    """
+    Executa a agregação com o índice sugerido. Os índices só existem depois da
+    migração (RUN_MIGRATIONS=1 ou scripts/ensure_indexes.py); sem eles o servidor
+    recusa o hint e a agregação é repetida deixando o planner escolher.
+    """
+    if hint:
+        try:
+            return await auto_infracao_collection.aggregate(pipeline, hint=hint).to_list(length=length)
+        except OperationFailure as e:
+            logger.warning("Hint %s recusado (%s); agregação repetida sem hint", hint, e)
+    return await auto_infracao_collection.aggregate(pipeline).to_list(length=length)
+
+# Estágios fixos das consultas por seq_auto_infracao, montados uma única vez;
+# a cada requisição só o $match inicial é criado.
+# Os $lookup usam sempre localField/foreignField (a forma let/$expr pode deixar de
+# usar o índice do foreignField). Filtro novo sobre um campo dos filhos
+# (ex.: enquadramentos.tp_norma) entra como $match no início do "pipeline" do
+# $lookup, para filtrar no servidor antes de montar o array juntado
+_ESTAGIOS_AGREGACAO = (
+    {
+        "$lookup": {
+            "from": "enquadramento",
+            "localField": "seq_auto_infracao",
+            "foreignField": "seq_auto_infracao",
+            "as": "enquadramentos"
+        }
+    },
+    {
+        "$addFields": {
+            "total_enquadramentos": {"$size": "$enquadramentos"}
+        }
+    }
+)
+
+# Teto de filhos trazidos por $lookup no auto completo: mantém o array juntado
+# (e o documento resultante) longe dos limites de 16MB/100MB da agregação
+LIMITE_FILHOS_LOOKUP = 10000
+
+_ESTAGIOS_COMPLETO = (
+    # localField/foreignField mantém o uso do índice; o $project no pipeline do
+    # $lookup descarta o seq_auto_infracao repetido em cada filho (já está no pai)
+    {
+        "$lookup": {
+            "from": "enquadramento",
+            "localField": "seq_auto_infracao",
+            "foreignField": "seq_auto_infracao",
+            "pipeline": [{"$limit": LIMITE_FILHOS_LOOKUP}, {"$project": {"seq_auto_infracao": 0}}],
+            "as": "enquadramentos"
+        }
+    },
+    {
+        "$lookup": {
+            "from": "especime",
+            "localField": "seq_auto_infracao",
+            "foreignField": "seq_auto_infracao",
+            "pipeline": [{"$limit": LIMITE_FILHOS_LOOKUP}, {"$project": {"seq_auto_infracao": 0}}],
+            "as": "especimes"
+        }
+    },
+    # Totais reais contados à parte (só pelo índice de seq_auto_infracao): os arrays
+    # acima param em LIMITE_FILHOS_LOOKUP e "truncado" indica quando isso ocorreu
+    {
+        "$lookup": {
+            "from": "enquadramento",
+            "localField": "seq_auto_infracao",
+            "foreignField": "seq_auto_infracao",
+            "pipeline": [{"$count": "n"}],
+            "as": "_contagem_enquadramentos"
+        }
+    },
+    {
+        "$lookup": {
+            "from": "especime",
+            "localField": "seq_auto_infracao",
+            "foreignField": "seq_auto_infracao",
+            "pipeline": [{"$count": "n"}],
+            "as": "_contagem_especimes"
+        }
+    },
+    {
+        "$addFields": {
+            "total_enquadramentos": {"$ifNull": [{"$arrayElemAt": ["$_contagem_enquadramentos.n", 0]}, 0]},
+            "total_especimes": {"$ifNull": [{"$arrayElemAt": ["$_contagem_especimes.n", 0]}, 0]},
+            "limite_filhos": LIMITE_FILHOS_LOOKUP
+        }
+    },
+    {
+        "$addFields": {
+            "truncado": {
+                "$or": [
+                    {"$gt": ["$total_enquadramentos", {"$size": "$enquadramentos"}]},
+                    {"$gt": ["$total_especimes", {"$size": "$especimes"}]}
+                ]
+            }
+        }
+    },
+    {"$project": {"_contagem_enquadramentos": 0, "_contagem_especimes": 0}}
+)
+
+def _intervalo_datas(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """
+    Converte datas AAAA-MM-DD em um filtro de datetime, comparável com o
+    dat_hora_auto_infracao gravado como data BSON (e atendido pelo índice).
+    """
+    date_range: dict = {}
+    try:
+        if start_date:
+            date_range["$gte"] = datetime.fromisoformat(start_date)
+        if end_date:
+            date_range["$lt"] = datetime.fromisoformat(end_date) + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido. Use AAAA-MM-DD.")
+    return date_range
+
+def _cursor_listagem(after: str, sort_field: str) -> tuple:
+    """
+    Decodifica o token de continuação "valor|_id" devolvido em meta.next_cursor.
+    O valor é interpretado conforme o campo de ordenação.
+    """
+    try:
+        valor, oid = after.rsplit("|", 1)
+        if sort_field == "dat_hora_auto_infracao":
+            valor = datetime.fromisoformat(valor) if valor else None
+        else:
+            valor = float(valor) if valor else None
+        return valor, ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+
+@router.get("/auto-infracao-enquadramento/{seq_auto_infracao}", response_class=_RespostaBSON)
 async def buscar_auto_infracao_com_enquadramento(seq_auto_infracao: int) -> Dict[str, Any]:
     """
     Busca um auto de infração e seus respectivos enquadramentos através do SEQ_AUTO_INFRACAO.
@@ -35,11 +203,13 @@ async def buscar_auto_infracao_com_enquadramento(seq_auto_infracao: int) -> Dict
         Dicionário contendo os dados do auto de infração e lista de enquadramentos
     """
     try:
-        logger.info(f"Buscando auto de infração e enquadramentos para SEQ_AUTO_INFRACAO: {seq_auto_infracao}")
+        logger.debug("Buscando auto de infração e enquadramentos para SEQ_AUTO_INFRACAO: %s", seq_auto_infracao)
         
-        # Buscar o auto de infração
-        auto_infracao = await auto_infracao_collection.find_one(
-            {"seq_auto_infracao": seq_auto_infracao}
+        # Auto de infração e enquadramentos são consultas independentes:
+        # disparadas juntas, custam uma ida ao banco em vez de duas em sequência
+        auto_infracao, enquadramentos = await asyncio.gather(
+            auto_infracao_collection.find_one({"seq_auto_infracao": seq_auto_infracao}),
+            enquadramento_collection.find({"seq_auto_infracao": seq_auto_infracao}).to_list(length=None)
         )
         
         if not auto_infracao:
@@ -48,20 +218,6 @@ async def buscar_auto_infracao_com_enquadramento(seq_auto_infracao: int) -> Dict
                 detail=f"Auto de infração com SEQ_AUTO_INFRACAO {seq_auto_infracao} não encontrado"
             )
         
-        # Buscar todos os enquadramentos relacionados
-        enquadramentos_cursor = enquadramento_collection.find(
-            {"seq_auto_infracao": seq_auto_infracao}
-        )
-        enquadramentos = await enquadramentos_cursor.to_list(length=None)
-        
-        # Converter ObjectId para string nos resultados
-        if auto_infracao.get("_id"):
-            auto_infracao["_id"] = str(auto_infracao["_id"])
-            
-        for enquadramento in enquadramentos:
-            if enquadramento.get("_id"):
-                enquadramento["_id"] = str(enquadramento["_id"])
-        
         # Retornar resultado estruturado
         resultado = {
             "seq_auto_infracao": seq_auto_infracao,
@@ -70,29 +226,31 @@ async def buscar_auto_infracao_com_enquadramento(seq_auto_infracao: int) -> Dict
             "total_enquadramentos": len(enquadramentos)
         }
         
-        logger.info(f"Consulta realizada com sucesso. Encontrados {len(enquadramentos)} enquadramentos")
-        return resultado
+        logger.info("Consulta realizada com sucesso. Encontrados %s enquadramentos", len(enquadramentos))
+        return _RespostaBSON(resultado)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao buscar auto de infração e enquadramentos: {str(e)}")
+        logger.error("Erro ao buscar auto de infração e enquadramentos: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
-@router.get("/auto-infracao-enquadramento-multiplos")
+@router.get("/auto-infracao-enquadramento-multiplos", response_class=_RespostaBSON)
 async def buscar_multiplos_autos_com_enquadramento(
     seq_auto_infracoes: str = Query(..., description="Lista de SEQ_AUTO_INFRACAO separados por vírgula"),
-    limite: int = Query(100, description="Número máximo de resultados", ge=1, le=1000)
+    limite: int = Query(100, description="Número máximo de resultados por página", ge=1, le=1000),
+    pagina: int = Query(1, description="Página de resultados", ge=1)
 ) -> Dict[str, Any]:
     """
     Busca múltiplos autos de infração e seus respectivos enquadramentos.
     
     Args:
         seq_auto_infracoes: String com SEQ_AUTO_INFRACAO separados por vírgula (ex: "123,456,789")
-        limite: Número máximo de resultados a retornar
+        limite: Número máximo de resultados por página
+        pagina: Página de resultados, na ordem da lista recebida
         
     Returns:
         Dicionário contendo lista de autos de infração com seus enquadramentos
@@ -107,63 +265,76 @@ async def buscar_multiplos_autos_com_enquadramento(
                 detail="Formato inválido para seq_auto_infracoes. Use números separados por vírgula."
             )
         
-        # Limitar o número de consultas
-        if len(seq_list) > limite:
-            seq_list = seq_list[:limite]
+        # Um resultado por sequencial, na ordem da primeira ocorrência
+        seq_list = list(dict.fromkeys(seq_list))
         
-        logger.info(f"Buscando {len(seq_list)} autos de infração com enquadramentos")
+        logger.info("Buscando %s autos de infração com enquadramentos (página %s)", len(seq_list), pagina)
         
+        # Uma única agregação para todos os sequenciais: o $facet devolve o total
+        # encontrado e a página sobre o mesmo $match, e o $lookup dos enquadramentos
+        # só roda para os autos da página
+        pipeline = [
+            {"$match": {"seq_auto_infracao": {"$in": seq_list}}},
+            # Um auto por sequencial (o primeiro gravado), como na busca por find_one
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$seq_auto_infracao", "auto_infracao": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$auto_infracao"}},
+            # Ordem da lista recebida, calculada no servidor
+            {"$addFields": {"_ordem": {"$indexOfArray": [seq_list, "$seq_auto_infracao"]}}},
+            {"$sort": {"_ordem": 1}},
+            {"$project": {"_ordem": 0}},
+            {"$facet": {
+                "total": [{"$count": "n"}],
+                "items": [
+                    {"$skip": (pagina - 1) * limite},
+                    {"$limit": limite},
+                    {
+                        "$lookup": {
+                            "from": "enquadramento",
+                            "localField": "seq_auto_infracao",
+                            "foreignField": "seq_auto_infracao",
+                            "as": "enquadramentos"
+                        }
+                    }
+                ]
+            }}
+        ]
+        facetas = (await auto_infracao_collection.aggregate(pipeline).to_list(length=1))[0]
+        total_encontrados = facetas["total"][0]["n"] if facetas["total"] else 0
+
         resultados = []
-        
-        for seq_auto_infracao in seq_list:
-            # Buscar o auto de infração
-            auto_infracao = await auto_infracao_collection.find_one(
-                {"seq_auto_infracao": seq_auto_infracao}
-            )
-            
-            if auto_infracao:
-                # Buscar enquadramentos relacionados
-                enquadramentos_cursor = enquadramento_collection.find(
-                    {"seq_auto_infracao": seq_auto_infracao}
-                )
-                enquadramentos = await enquadramentos_cursor.to_list(length=None)
-                
-                # Converter ObjectId para string
-                if auto_infracao.get("_id"):
-                    auto_infracao["_id"] = str(auto_infracao["_id"])
-                    
-                for enquadramento in enquadramentos:
-                    if enquadramento.get("_id"):
-                        enquadramento["_id"] = str(enquadramento["_id"])
-                
-                resultado_item = {
-                    "seq_auto_infracao": seq_auto_infracao,
-                    "auto_infracao": auto_infracao,
-                    "enquadramentos": enquadramentos,
-                    "total_enquadramentos": len(enquadramentos)
-                }
-                resultados.append(resultado_item)
+        for auto_infracao in facetas["items"]:
+            enquadramentos = auto_infracao.pop("enquadramentos")
+            resultados.append({
+                "seq_auto_infracao": auto_infracao["seq_auto_infracao"],
+                "auto_infracao": auto_infracao,
+                "enquadramentos": enquadramentos,
+                "total_enquadramentos": len(enquadramentos)
+            })
         
         # Retornar resultado estruturado
         response = {
-            "total_encontrados": len(resultados),
+            "total_encontrados": total_encontrados,
             "total_solicitados": len(seq_list),
+            "pagina": pagina,
+            "limite": limite,
             "resultados": resultados
         }
         
-        logger.info(f"Consulta múltipla realizada com sucesso. {len(resultados)} de {len(seq_list)} encontrados")
-        return response
+        logger.info("Consulta múltipla realizada com sucesso. %s de %s encontrados", total_encontrados, len(seq_list))
+        # A página é limitada por `limite`; serializada direto pelo orjson (ObjectId como str)
+        return _RespostaBSON(response)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao buscar múltiplos autos de infração: {str(e)}")
+        logger.error("Erro ao buscar múltiplos autos de infração: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
-@router.get("/auto-infracao-enquadramento/agregacao/{seq_auto_infracao}")
+@router.get("/auto-infracao-enquadramento/agregacao/{seq_auto_infracao}", response_class=_RespostaBSON)
 async def buscar_auto_infracao_agregacao(seq_auto_infracao: int) -> Dict[str, Any]:
     """
     Busca um auto de infração com seus enquadramentos usando agregação MongoDB.
@@ -176,29 +347,16 @@ async def buscar_auto_infracao_agregacao(seq_auto_infracao: int) -> Dict[str, An
         Dicionário contendo os dados do auto de infração com enquadramentos agregados
     """
     try:
-        logger.info(f"Buscando auto de infração com agregação para SEQ_AUTO_INFRACAO: {seq_auto_infracao}")
+        logger.debug("Buscando auto de infração com agregação para SEQ_AUTO_INFRACAO: %s", seq_auto_infracao)
+        
+        chave = ("agregacao", seq_auto_infracao)
+        em_cache = resposta_em_cache(chave)
+        if em_cache is not None:
+            logger.debug("Auto de infração %s servido do cache", seq_auto_infracao)
+            return _RespostaBSON(em_cache)
         
         # Pipeline de agregação que faz lookup com a coleção de enquadramentos
-        pipeline = [
-            {
-                "$match": {
-                    "seq_auto_infracao": seq_auto_infracao
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "enquadramento",
-                    "localField": "seq_auto_infracao",
-                    "foreignField": "seq_auto_infracao",
-                    "as": "enquadramentos"
-                }
-            },
-            {
-                "$addFields": {
-                    "total_enquadramentos": {"$size": "$enquadramentos"}
-                }
-            }
-        ]
+        pipeline = [{"$match": {"seq_auto_infracao": seq_auto_infracao}}, *_ESTAGIOS_AGREGACAO]
         
         # Executar a agregação
         cursor = auto_infracao_collection.aggregate(pipeline)
@@ -210,73 +368,47 @@ async def buscar_auto_infracao_agregacao(seq_auto_infracao: int) -> Dict[str, An
                 detail=f"Auto de infração com SEQ_AUTO_INFRACAO {seq_auto_infracao} não encontrado"
             )
         
-        # Converter ObjectId para string
         auto_infracao_completo = resultado[0]
-        if auto_infracao_completo.get("_id"):
-            auto_infracao_completo["_id"] = str(auto_infracao_completo["_id"])
-            
-        for enquadramento in auto_infracao_completo.get("enquadramentos", []):
-            if enquadramento.get("_id"):
-                enquadramento["_id"] = str(enquadramento["_id"])
         
-        logger.info(f"Consulta com agregação realizada com sucesso. Encontrados {auto_infracao_completo.get('total_enquadramentos', 0)} enquadramentos")
-        return auto_infracao_completo
+        logger.info("Consulta com agregação realizada com sucesso. Encontrados %s enquadramentos", auto_infracao_completo.get('total_enquadramentos', 0))
+        guardar_resposta(chave, auto_infracao_completo)
+        return _RespostaBSON(auto_infracao_completo)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao buscar auto de infração com agregação: {str(e)}")
+        logger.error("Erro ao buscar auto de infração com agregação: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
-@router.get("/auto-infracao-completo/{seq_auto_infracao}")
+@router.get("/auto-infracao-completo/{seq_auto_infracao}", response_class=_RespostaBSON)
 async def buscar_auto_completo(seq_auto_infracao: int) -> Dict[str, Any]:
     """
     Retorna um auto de infração com seus enquadramentos e espécimes relacionados.
+    Cada lista traz no máximo `limite_filhos` itens; `total_enquadramentos` e
+    `total_especimes` são os totais reais e `truncado` indica listas cortadas.
     """
     try:
-        pipeline = [
-            {"$match": {"seq_auto_infracao": seq_auto_infracao}},
-            {
-                "$lookup": {
-                    "from": "enquadramento",
-                    "localField": "seq_auto_infracao",
-                    "foreignField": "seq_auto_infracao",
-                    "as": "enquadramentos"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "especime",
-                    "localField": "seq_auto_infracao",
-                    "foreignField": "seq_auto_infracao",
-                    "as": "especimes"
-                }
-            },
-            {
-                "$addFields": {
-                    "total_enquadramentos": {"$size": "$enquadramentos"},
-                    "total_especimes": {"$size": "$especimes"}
-                }
-            }
-        ]
+        chave = ("completo", seq_auto_infracao)
+        em_cache = resposta_em_cache(chave)
+        if em_cache is not None:
+            logger.debug("Auto de infração completo %s servido do cache", seq_auto_infracao)
+            return _RespostaBSON(em_cache)
+
+        pipeline = [{"$match": {"seq_auto_infracao": seq_auto_infracao}}, *_ESTAGIOS_COMPLETO]
 
-        resultado = await auto_infracao_collection.aggregate(pipeline).to_list(length=1)
+        # Consulta de usuário: limitada pelos $limit dos lookups, nunca recorre ao disco
+        resultado = await auto_infracao_collection.aggregate(pipeline, allowDiskUse=False).to_list(length=1)
         if not resultado:
             raise HTTPException(status_code=404, detail="Auto de infração não encontrado")
 
         auto = resultado[0]
-        auto["_id"] = str(auto["_id"])
-        for item in auto["enquadramentos"]:
-            item["_id"] = str(item["_id"])
-        for item in auto["especimes"]:
-            item["_id"] = str(item["_id"])
-
-        return auto
+        guardar_resposta(chave, auto)
+        return _RespostaBSON(auto)
     except Exception as e:
-        logger.error("Erro completo:\n" + traceback.format_exc())
+        logger.error("Erro completo", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @router.get("/auto_infracao/detailed")
@@ -291,11 +423,13 @@ async def listagem_completa_auto(
                  ),
     order:      str = Query("desc", regex="^(asc|desc)$"),
     page:       int = Query(1, ge=1),
-    limit:      int = Query(10, ge=1, le=100)
+    limit:      int = Query(10, ge=1, le=100),
+    after:      Optional[str] = Query(None, description="Cursor de continuação (meta.next_cursor da página anterior)")
 ):
     """
     Retorna autos de infração completos, com enquadramentos e espécies,
     aplicando filtros, ordenação e paginação.
+    Com `after`, a página continua do cursor informado em vez de usar `page`.
     """
     try:
         logger.info("Iniciando listagem completa de autos de infração")
@@ -303,40 +437,52 @@ async def listagem_completa_auto(
         # 1) Monta filtros
         match_stage: dict = {}
         if start_date or end_date:
-            date_range: dict = {}
-            if start_date:
-                date_range["$gte"] = f"{start_date}T00:00:00"
-            if end_date:
-                date_range["$lte"] = f"{end_date}T23:59:59"
+            date_range = _intervalo_datas(start_date, end_date)
             match_stage["dat_hora_auto_infracao"] = date_range
-            logger.debug(f"Filtro de data: {date_range!r}")
+            logger.debug("Filtro de data: %r", date_range)
         if municipio:
             match_stage["municipio"] = municipio
-            logger.debug(f"Filtro de município: {municipio!r}")
+            logger.debug("Filtro de município: %r", municipio)
 
         # 2) Ordenação e paginação
         direction = 1 if order == "asc" else -1
-        skip = (page - 1) * limit
         # Normaliza sort_by para o nome real do campo no MongoDB (minúsculas)
         sort_field = sort_by.lower()
-        logger.debug(f"Sort: {sort_field} {order}, skip={skip}, limit={limit}")
 
-        # 3) Pipeline de agregação com lookups limitados usando sub-pipeline
+        # Keyset: continua a partir de (valor, _id) do último item da página
+        # anterior, sem reler os documentos já entregues como faz o $skip
+        pagina_match = dict(match_stage)
+        skip = 0
+        if after:
+            valor, ultimo_id = _cursor_listagem(after, sort_field)
+            op = "$gt" if direction == 1 else "$lt"
+            pagina_match["$or"] = [
+                {sort_field: {op: valor}},
+                {sort_field: valor, "_id": {op: ultimo_id}},
+            ]
+        else:
+            skip = (page - 1) * limit
+        logger.debug("Sort: %s %s, skip=%s, limit=%s, after=%r", sort_field, order, skip, limit, after)
+
+        # 3) Pipeline de agregação: ordena e limita antes dos lookups, que
+        # rodam apenas sobre os documentos da página
         pipeline: list[dict] = []
-        if match_stage:
-            pipeline.append({"$match": match_stage})
+        if pagina_match:
+            pipeline.append({"$match": pagina_match})
 
+        pipeline.append({"$sort": {sort_field: direction, "_id": direction}})
+        if skip:
+            pipeline.append({"$skip": skip})
         pipeline += [
-            {"$sort": {sort_field: direction}},
-            {"$skip": skip},
             {"$limit": limit},
 
-            # lookup limitado para enquadramentos
+            # lookup limitado para enquadramentos (igualdade em localField/foreignField
+            # usa o índice idx_enq_seq_auto_covering, ao contrário do $match com $expr)
             {"$lookup": {
                 "from": "enquadramento",
-                "let": {"auto_id": "$seq_auto_infracao"},
+                "localField": "seq_auto_infracao",
+                "foreignField": "seq_auto_infracao",
                 "pipeline": [
-                    {"$match": {"$expr": {"$eq": ["$seq_auto_infracao", "$$auto_id"]}}},
                     {"$limit": 100},
                     {"$project": {"_id": 0, "sq_enquadramento": 1, "tp_norma": 1, "nu_norma": 1}}
                 ],
@@ -346,9 +492,9 @@ async def listagem_completa_auto(
             # lookup limitado para espécies
             {"$lookup": {
                 "from": "especime",
-                "let": {"auto_id": "$seq_auto_infracao"},
+                "localField": "seq_auto_infracao",
+                "foreignField": "seq_auto_infracao",
                 "pipeline": [
-                    {"$match": {"$expr": {"$eq": ["$seq_auto_infracao", "$$auto_id"]}}},
                     {"$limit": 100},
                     {"$project": {"_id": 0, "seq_especime": 1, "quantidade": 1, "nome_popular": 1}}
                 ],
@@ -357,7 +503,7 @@ async def listagem_completa_auto(
 
             # projeta campos principais
             {"$project": {
-                "_id": 0,
+                "_id": 1,
                 "seq_auto_infracao": 1,
                 "dat_hora_auto_infracao": 1,
                 "municipio": 1,
@@ -366,40 +512,43 @@ async def listagem_completa_auto(
                 "especies": 1
             }}
         ]
-        logger.debug(f"Pipeline montado com {len(pipeline)} estágios")
+        logger.debug("Pipeline montado com %s estágios", len(pipeline))
 
         # 4) Conta total de documentos que casam com filtros
         count_pipeline = ([{"$match": match_stage}] if match_stage else []) + [{"$count": "total"}]
-        count_result = await auto_infracao_collection.aggregate(count_pipeline).to_list(1)
-        total = count_result[0]["total"] if count_result else 0
-        logger.info(f"Total de autos compatíveis: {total}")
-
-        # 5) Executa agregação com uso de disco
-        cursor = auto_infracao_collection.aggregate(pipeline, allowDiskUse=True)
-        results = await cursor.to_list(length=limit)
-        logger.info(f"Retornados {len(results)} registros na página {page}")
-
-        # 6) Converte objetos datetime para string
-        def convert_datetime_to_string(obj):
-            if isinstance(obj, dict):
-                return {key: convert_datetime_to_string(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_datetime_to_string(item) for item in obj]
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            else:
-                return obj
-
-        results = convert_datetime_to_string(results)
-
-        # 7) Retorna resposta
-        return JSONResponse({
-            "meta": {"page": page, "limit": limit, "total": total},
+        total = await _contar_com_cache(count_pipeline)
+        logger.info("Total de autos compatíveis: %s", total)
+
+        # 5) Executa agregação. A ordenação por data é atendida por índice (sem
+        # ordenação em memória nem em disco); para o valor, o $sort seguido de
+        # $limit mantém só os `limit` primeiros documentos em memória
+        hint = None
+        if sort_field == "dat_hora_auto_infracao":
+            hint = "idx_auto_municipio_data" if municipio else "idx_auto_data_id"
+        results = await _agregar_com_hint(pipeline, hint, limit)
+        logger.info("Retornados %s registros na página %s", len(results), page)
+
+        # Cursor da próxima página a partir do último item retornado
+        next_cursor = None
+        if len(results) == limit:
+            ultimo = results[-1]
+            valor = ultimo.get(sort_field)
+            if isinstance(valor, datetime):
+                valor = valor.isoformat()
+            next_cursor = f"{'' if valor is None else valor}|{ultimo['_id']}"
+        for doc in results:
+            doc.pop("_id", None)
+
+        # 6) Retorna resposta (datetimes serializados nativamente pelo orjson)
+        return ORJSONResponse({
+            "meta": {"page": page, "limit": limit, "total": total, "next_cursor": next_cursor},
             "data": results
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erro na listagem completa de autos de infração: {e}", exc_info=True)
+        logger.error("Erro na listagem completa de autos de infração: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erro ao executar consulta completa de autos de infração.")
 
 @router.get("/infractions-by-biome")
@@ -423,87 +572,73 @@ async def stats_infracoes_bioma(
         logger.info("Iniciando agregação de estatísticas por bioma")
 
         # 1) Filtro de data e bioma (obrigatório)
-        match_stage: dict = {"ds_biomas_atingidos": bioma}  # usa o campo correto do auto_infracao
+        match_stage: dict = {"bioma": bioma}  # DS_BIOMAS_ATINGIDOS é gravado como "bioma" no upload
         if start_date or end_date:
-            date_range: dict = {}
-            if start_date:
-                date_range["$gte"] = f"{start_date}T00:00:00"
-            if end_date:
-                date_range["$lte"] = f"{end_date}T23:59:59"
+            date_range = _intervalo_datas(start_date, end_date)
             match_stage["dat_hora_auto_infracao"] = date_range
-            logger.debug(f"Filtro de data: {date_range}")
-        logger.debug(f"Filtro de bioma: {bioma}")
+            logger.debug("Filtro de data: %s", date_range)
+        logger.debug("Filtro de bioma: %s", bioma)
 
         # 2) Ordenação e paginação
         sort_dir = 1 if order == "asc" else -1
         skip = (page - 1) * limit
 
-        # 3) Pipeline principal
+        # 3) Pipeline único: o $facet devolve a página e o total de grupos na mesma
+        # ida ao banco, sobre um único $match (antes eram duas agregações)
         pipeline: list[dict] = [
             {"$match": match_stage},
             {"$group": {
-                "_id": "$ds_biomas_atingidos",  # agrupa pelo campo correto
+                "_id": "$bioma",
                 "total_infracoes": {"$sum": 1},
-                "media_valor": {"$avg": {"$toDouble": {"$replaceAll": {"input": "$val_auto_infracao", "find": ",", "replacement": "."}}}}
+                "media_valor": {"$avg": "$val_auto_infracao"}  # já gravado como número no upload
             }},
-            {"$lookup": {
-                "from": "bioma",
-                "let": {"nome_bioma": "$_id"},
-                "pipeline": [
-                    {"$match": {"$expr": {"$eq": ["$bioma", "$$nome_bioma"]}}},
-                    {"$sort": {"ultima_atualizacao_relatorio": -1}},
-                    {"$limit": 1},
-                    {"$project": {"_id": 0, "ultima_atualizacao": "$ultima_atualizacao_relatorio"}}
-                ],
-                "as": "bioma_info"
-            }},
-            {"$project": {
-                "_id": 0,
-                "bioma": "$_id",
-                "total_infracoes": 1,
-                "media_valor": 1,
-                "ultima_atualizacao": {"$arrayElemAt": ["$bioma_info.ultima_atualizacao", 0]}
-            }},
-            {"$sort": {sort_by: sort_dir}},
-            {"$skip": skip},
-            {"$limit": limit}
+            {"$facet": {
+                "total": [{"$count": "total"}],
+                # A ordenação não depende do bioma juntado: a página é cortada antes
+                # do $lookup, que só roda para os grupos devolvidos
+                "data": [
+                    {"$sort": {sort_by: sort_dir}},
+                    {"$skip": skip},
+                    {"$limit": limit},
+                    {"$lookup": {
+                        "from": "bioma",
+                        "localField": "_id",
+                        "foreignField": "bioma",
+                        "pipeline": [
+                            {"$sort": {"ultima_atualizacao": -1}},
+                            {"$limit": 1},
+                            {"$project": {"_id": 0, "ultima_atualizacao": 1}}
+                        ],
+                        "as": "bioma_info"
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "bioma": "$_id",
+                        "total_infracoes": 1,
+                        "media_valor": 1,
+                        "ultima_atualizacao": {"$arrayElemAt": ["$bioma_info.ultima_atualizacao", 0]}
+                    }}
+                ]
+            }}
         ]
-        logger.debug(f"Pipeline: {pipeline}")
+        logger.debug("Pipeline: %s", pipeline)
 
-        # 4) Total de registros para paginação
-        count_pipeline: list[dict] = [
-            {"$match": match_stage},
-            {"$group": {"_id": "$bioma"}},
-            {"$count": "total"}
-        ]
-        count_result = await auto_infracao_collection.aggregate(count_pipeline).to_list(1)
-        total = count_result[0]["total"] if count_result else 0
-
-        # 5) Executa agregação
-        cursor = auto_infracao_collection.aggregate(pipeline, allowDiskUse=True)
-        results = await cursor.to_list(length=limit)
-        logger.info(f"Consulta de estatísticas por bioma retornou {len(results)} registros")
-
-        # 6) Converte objetos datetime para string
-        def convert_datetime_to_string(obj):
-            if isinstance(obj, dict):
-                return {key: convert_datetime_to_string(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_datetime_to_string(item) for item in obj]
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            else:
-                return obj
-
-        results = convert_datetime_to_string(results)
-
-        return JSONResponse({
+        # 4) Executa agregação (o $match usa idx_auto_bioma_data; o $group reduz a um documento)
+        facetas = (await _agregar_com_hint(pipeline, "idx_auto_bioma_data", 1))[0]
+        total = facetas["total"][0]["total"] if facetas["total"] else 0
+        results = facetas["data"]
+        logger.info("Consulta de estatísticas por bioma retornou %s registros", len(results))
+
+        # 5) Retorna resposta (datetimes serializados nativamente pelo orjson)
+        return ORJSONResponse({
             "meta": {"page": page, "limit": limit, "total": total},
             "data": results
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erro nas estatísticas por bioma: {e}", exc_info=True)
+        logger.error("Erro nas estatísticas por bioma: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Erro ao processar estatísticas por bioma.")
 
 @router.get("/auto-infracao/biomas/especimes")
@@ -514,7 +649,7 @@ async def busca_especimes_por_bioma_em_auto_infracao(
         skip:int = Query(1, ge=0, le=10),
         limit: int = Query(100, description="Número máximo", ge=1, len=1000)):
     try:
-        logger.info(f"Buscando nomes populares pela bioma: {bioma}")
+        logger.info("Buscando nomes populares pela bioma: %s", bioma)
 
         filter = {
             "dat_hora_auto_infracao": {
@@ -526,30 +661,43 @@ async def busca_especimes_por_bioma_em_auto_infracao(
         if bioma:
             filter["bioma"] = {"$regex": bioma, "$options": "i"}
 
-        infra_docs = await auto_infracao_collection.find(filter).skip(skip).limit(limit).to_list(length=None)
+        # Os espécimes de cada auto vêm no mesmo pipeline, pelo $lookup,
+        # em vez de uma consulta por auto de infração
+        pipeline = [
+            {"$match": filter},
+            {"$skip": skip},
+            {"$limit": limit},
+            {
+                "$lookup": {
+                    "from": "especime",
+                    "localField": "seq_auto_infracao",
+                    "foreignField": "seq_auto_infracao",
+                    "as": "especimes"
+                }
+            }
+        ]
+        infra_docs = await auto_infracao_collection.aggregate(pipeline).to_list(length=None)
 
         if not infra_docs:
-            logger.warning(f"Nenhuma auto infração encontrada no bioma: {bioma}")
+            logger.warning("Nenhuma auto infração encontrada no bioma: %s", bioma)
             raise HTTPException(status_code=404, detail="Nenhuma auto infração encontrada")
 
+        # Documentos vindos do banco, validados no upload: model_construct monta os
+        # modelos sem rodar os validadores de novo
         results = []
         for infra in infra_docs:
-            infra_model = AutoInfracaoOut(**infra)
-
-            especimes = await especime_collection.find({
-                "seq_auto_infracao": infra_model.seq_auto_infracao
-            }).to_list(length=None)
-
-            especimes_models = [EspecimeOut(**e) for e in especimes]
-
+            especimes = infra.pop("especimes")
             results.append({
-                "auto_infracao": infra_model.dict(),
-                "especimes": [e.dict() for e in especimes_models]
+                "auto_infracao": AutoInfracaoOut.model_construct(**{**infra, "_id": str(infra["_id"])}).model_dump(by_alias=True),
+                "especimes": [
+                    EspecimeOut.model_construct(**{**e, "_id": str(e["_id"])}).model_dump(by_alias=True)
+                    for e in especimes
+                ]
             })
 
-        logger.info(f"Encontradas {len(results)} autuações com espécimes")
-        return results
+        logger.info("Encontradas %s autuações com espécimes", len(results))
+        return ORJSONResponse(results)
 
     except HTTPException as e:
-        logger.error(f"Erro ao buscar nomes populares das espécimes: {e}")
+        logger.error("Erro ao buscar nomes populares das espécimes: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
\ No newline at end of file
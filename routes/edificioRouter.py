@@ -5,7 +5,8 @@ import pandas as pd
 import io
 import re
 from fastapi.responses import StreamingResponse
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 from models.edificio_IBAMA import Edf_Pub_Civil_IBAMACreate, Edf_Pub_Civil_IBAMAOut, PaginatedEdf_Pub_Civil_IBAMAResponse
 from logs.logger import logger
@@ -13,10 +14,29 @@ from logs.logger import logger
 
 router = APIRouter(prefix="/edf", tags=["Edf Pub Civil IBAMA"])
 
+COLUNA_EDIFICIO = {
+    "nome": "nome",
+    "nomeabrev": "nomeabrev",
+    "municip": "municipio",
+    "estado": "estado",
+    "situacaofisica": "situacao_fisica",
+    "lat": "lat",
+    "long": "long"
+}
+
+# Somente os campos de Edf_Pub_Civil_IBAMAOut (o _id vem por padrão): o ponto
+# GeoJSON "location" fica no banco, usado apenas pela busca geoespacial
+PROJECAO_EDIFICIO = {campo: 1 for campo in COLUNA_EDIFICIO.values()}
+
+# Padrões usados na conversão DMS, compilados uma única vez
+_ESPACOS_RE = re.compile(r'\s+')
+_HEMISFERIO_NEGATIVO_RE = re.compile(r'[SWsw]')
+_SEPARADORES_DMS_RE = re.compile(r'[°\'"]+')
+
 def dms_to_decimal(dms_str: str) -> float:
-    s = re.sub(r'\s+', '', dms_str)
-    sign = -1 if re.search(r'[SWsw]', s) else 1
-    parts = re.split(r'[°\'"]+', s)
+    s = _ESPACOS_RE.sub('', dms_str)
+    sign = -1 if _HEMISFERIO_NEGATIVO_RE.search(s) else 1
+    parts = _SEPARADORES_DMS_RE.split(s)
     deg, min_, sec = parts[0], parts[1], parts[2]
     return sign * (float(deg) + float(min_)/60 + float(sec)/3600)
 
@@ -26,7 +46,7 @@ async def upload_edf_csv(file: UploadFile = File(...)):
     logger.info(f"Iniciando upload de arquivo CSV: {file.filename}")
     
     df = pd.read_csv(
-        io.BytesIO(await file.read()),
+        file.file,
         dtype=str,
         keep_default_na=False,
         na_values=['']
@@ -34,22 +54,22 @@ async def upload_edf_csv(file: UploadFile = File(...)):
     
     logger.info(f"Arquivo CSV carregado com {len(df)} linhas")
 
-    coluna_map = {
-        "nome": "nome",
-        "nomeabrev": "nomeabrev",
-        "municip": "municipio",
-        "estado": "estado",
-        "situacaofisica": "situacao_fisica",
-        "lat": "lat",
-        "long": "long"
-    }
+    cols_existentes = [c for c in df.columns if c in COLUNA_EDIFICIO]
+    df = df[cols_existentes].rename(columns={c: COLUNA_EDIFICIO[c] for c in cols_existentes})
 
-    cols_existentes = [c for c in df.columns if c in coluna_map]
-    df = df[cols_existentes].rename(columns={c: coluna_map[c] for c in cols_existentes})
+    # Todos os campos são obrigatórios: linhas com vazios (NaN) são descartadas
+    # por uma máscara vetorizada, antes do laço de conversão DMS/validação
+    incompletas = df.isna().any(axis=1)
+    total_incompletas = int(incompletas.sum())
+    if total_incompletas:
+        logger.warning(f"Total de {total_incompletas} linhas com campos vazios descartadas")
+        df = df.loc[~incompletas]
 
     docs = []
-    for i, row in df.iterrows():
-        d = row.to_dict()
+    # itertuples evita montar uma Series por linha, como fazia o iterrows
+    colunas = tuple(df.columns)
+    for i, *valores in df.itertuples(index=True, name=None):
+        d = dict(zip(colunas, valores))
         try:
             #Converter DMS → decimal
             lat_dd = dms_to_decimal(d["lat"])
@@ -57,7 +77,9 @@ async def upload_edf_csv(file: UploadFile = File(...)):
 
             #Validar e construir o documento
             inst = Edf_Pub_Civil_IBAMACreate(**d)
-            doc = inst.dict()
+            # Campos simples e já validados: uma cópia do __dict__ vira o documento,
+            # que recebe location e o _id do insert_many sem alterar o modelo
+            doc = inst.__dict__.copy()
             doc["location"] = {
                 "type": "Point",
                 "coordinates": [long_dd, lat_dd]
@@ -72,7 +94,7 @@ async def upload_edf_csv(file: UploadFile = File(...)):
         raise HTTPException(400, "Nenhum registro válido após tratamento.")
 
     logger.info(f"Processando inserção de {len(docs)} documentos válidos")
-    res = await edificio_IBAMA_collection.insert_many(docs)
+    res = await edificio_IBAMA_collection.insert_many(docs, ordered=False)
     
     logger.info(f"Upload concluído com sucesso: {len(docs)} edificios inseridos")
     return [
@@ -91,7 +113,7 @@ async def get_by_nome(nome: str):
     try:
         regex = re.compile(nome, re.IGNORECASE)
         query = {"nome": regex}
-        docs = await edificio_IBAMA_collection.find(query).to_list(None)
+        docs = await edificio_IBAMA_collection.find(query, PROJECAO_EDIFICIO).to_list(None)
         
         if not docs:
             logger.warning(f"Nenhum edifício encontrado com o nome: {nome}")
@@ -133,24 +155,24 @@ async def plot_edificios_por_estado():
         totais = [item["total_edificios"] for item in stats]
 
         # Criar gráfico de barras
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(estados, totais, color="teal")
-        plt.title("Número de Edifícios por Estado (Sigla)")
-        plt.xlabel("Estado")
-        plt.ylabel("Total de Edifícios")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+        bars = ax.bar(estados, totais, color="teal")
+        ax.set_title("Número de Edifícios por Estado (Sigla)")
+        ax.set_xlabel("Estado")
+        ax.set_ylabel("Total de Edifícios")
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.tight_layout()
 
         # Adiciona rótulos nas barras
         for bar in bars:
             yval = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width() / 2, yval + 0.2, yval, ha='center', va='bottom')
+            ax.text(bar.get_x() + bar.get_width() / 2, yval + 0.2, yval, ha='center', va='bottom')
 
         # Exportar como imagem PNG
         buf = io.BytesIO()
-        plt.savefig(buf, format='png')
+        FigureCanvasAgg(fig).print_png(buf)
         buf.seek(0)
-        plt.close()
 
         return StreamingResponse(buf, media_type="image/png")
 
@@ -202,7 +224,7 @@ async def nearby(
                 }
             }
         }
-        docs = await edificio_IBAMA_collection.find(query).limit(1).to_list(1)
+        docs = await edificio_IBAMA_collection.find(query, PROJECAO_EDIFICIO).limit(1).to_list(1)
         if not docs:
             logger.warning(f"Nenhum edificio encontrado próximo às coordenadas {lat}, {long} dentro de {max_distance}m")
             raise HTTPException(404, "Nenhuma unidade próxima encontrada dentro da distância especificada.")
@@ -223,7 +245,7 @@ async def nearby(
 async def count_edificio():
     logger.info("Contando total de edificios na coleção")
     try:
-        count = await edificio_IBAMA_collection.count_documents({})
+        count = await edificio_IBAMA_collection.estimated_document_count()
         logger.info(f"Total de edificios encontrados: {count}")
         return {"count": count}
     except Exception as e:
@@ -234,8 +256,8 @@ async def count_edificio():
 async def get_edificios(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1)):
     logger.info(f"Buscando edificios - Página: {page}, Tamanho: {page_size}")
     try:
-        total = await edificio_IBAMA_collection.count_documents({})
-        items = await edificio_IBAMA_collection.find().skip((page - 1) * page_size).limit(page_size).to_list(length=None)
+        total = await edificio_IBAMA_collection.estimated_document_count()
+        items = await edificio_IBAMA_collection.find({}, PROJECAO_EDIFICIO).skip((page - 1) * page_size).limit(page_size).to_list(length=None)
         
         logger.info(f"Retornando {len(items)} edificios de um total de {total}")
         return PaginatedEdf_Pub_Civil_IBAMAResponse(total=total, page=page, size=page_size, items=items)
@@ -251,7 +273,7 @@ async def get_edificio(edificio_id: str):
             logger.warning(f"ID inválido fornecido: {edificio_id}")
             raise HTTPException(status_code=400, detail="ID inválido")
         
-        edificio = await edificio_IBAMA_collection.find_one({"_id": ObjectId(edificio_id)})
+        edificio = await edificio_IBAMA_collection.find_one({"_id": ObjectId(edificio_id)}, PROJECAO_EDIFICIO)
         if not edificio:
             logger.warning(f"Edificio não encontrado para ID: {edificio_id}")
             raise HTTPException(status_code=404, detail="Edifício não encontrado")
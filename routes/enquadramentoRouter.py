@@ -1,22 +1,29 @@
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException, UploadFile, File
-from models.enquadramento import EnquadramentoCreate, EnquadramentoOut, PaginatedEnquadramentoResponse
-from database import enquadramento_collection
+from models.enquadramento import EnquadramentoOut, PaginatedEnquadramentoResponse
+from database import enquadramento_collection, pagina_e_total
+from cache import limpar_cache_respostas
 import pandas as pd
-import io
-from datetime import datetime
-import math
 from logs.logger import logger
-from typing import List
 
 router = APIRouter(prefix="/enquadramento", tags=["Enquadramento"])
 
+COLUNA_ENQUADRAMENTO = {
+    "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
+    "NUM_AUTO_INFRACAO": "num_auto_infracao",
+    "SQ_ENQUADRAMENTO": "sq_enquadramento",
+    "ADMINISTRATIVO": "administrativo",
+    "TP_NORMA": "tp_norma",
+    "NU_NORMA": "nu_norma",
+    "ULTIMA_ATUALIZACAO_RELATORIO": "ultima_atualizacao"
+}
+
 @router.post("/upload", response_model=list[EnquadramentoOut])
 async def upload_enquadramento_csv(file: UploadFile = File(...)):
     logger.info(f"Iniciando upload de arquivo CSV de enquadramentos: {file.filename}")
     try:
         df = pd.read_csv(
-            io.BytesIO(await file.read()),
+            file.file,
             sep=";",
             dtype=str,
             keep_default_na=False,
@@ -25,65 +32,32 @@ async def upload_enquadramento_csv(file: UploadFile = File(...)):
         
         logger.info(f"Arquivo CSV carregado com {len(df)} linhas")
 
-        coluna_map = {
-            "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
-            "NUM_AUTO_INFRACAO": "num_auto_infracao",
-            "SQ_ENQUADRAMENTO": "sq_enquadramento",
-            "ADMINISTRATIVO": "administrativo",
-            "TP_NORMA": "tp_norma",
-            "NU_NORMA": "nu_norma",
-            "ULTIMA_ATUALIZACAO_RELATORIO": "ultima_atualizacao"
-        }
+        df = df.reindex(columns=list(COLUNA_ENQUADRAMENTO)).astype(object).rename(columns=COLUNA_ENQUADRAMENTO)
+
+        # Conversões vetorizadas (valores inválidos viram NaN/NaT)
+        for col in ("seq_auto_infracao", "sq_enquadramento", "nu_norma"):
+            valores = df[col].str.strip()
+            df[col] = pd.to_numeric(valores.where(valores.str.fullmatch(r"\d+", na=False)), errors="coerce")
+        df["ultima_atualizacao"] = pd.to_datetime(
+            df["ultima_atualizacao"].str.strip(), format="%Y-%m-%d %H:%M:%S", errors="coerce"
+        )
 
-        df = df[[col for col in coluna_map if col in df.columns]].rename(columns=coluna_map)
-
-        documentos = []
-        erros_processamento = 0
-        for i, row in df.iterrows():
-            try:
-                doc_dict = row.to_dict()
-
-                # Conversões seguras
-                seq_str = str(doc_dict.get("seq_auto_infracao") or "").strip()
-                doc_dict["seq_auto_infracao"] = int(seq_str) if seq_str.isdigit() else None
-
-                sq_str = str(doc_dict.get("sq_enquadramento") or "").strip()
-                doc_dict["sq_enquadramento"] = int(sq_str) if sq_str.isdigit() else None
-
-                nu_str = str(doc_dict.get("nu_norma") or "").strip()
-                doc_dict["nu_norma"] = int(nu_str) if nu_str.isdigit() else None
-
-                data_str = str(doc_dict.get("ultima_atualizacao") or "").strip()
-                doc_dict["ultima_atualizacao"] = (
-                    datetime.strptime(data_str, "%Y-%m-%d %H:%M:%S") if data_str else None
-                )
-
-                # Verificação de campos obrigatórios
-                campos_criticos = [
-                    doc_dict["seq_auto_infracao"],
-                    doc_dict["num_auto_infracao"],
-                    doc_dict["sq_enquadramento"],
-                    doc_dict["tp_norma"],
-                    doc_dict["nu_norma"],
-                    doc_dict["ultima_atualizacao"]
-                ]
-                if any(val is None or (isinstance(val, float) and (math.isnan(val) or math.isinf(val))) for val in campos_criticos):
-                    raise ValueError("Valores obrigatórios ausentes ou inválidos.")
-
-                enquadramento = EnquadramentoCreate(**doc_dict)
-                documentos.append(enquadramento.dict())
-
-            except Exception as e:
-                erros_processamento += 1
-                logger.warning(f"Erro na linha {i+1}: {e}")
-                continue
+        # Verificação de campos obrigatórios
+        mask = df.notna().all(axis=1)
+        erros_processamento = int((~mask).sum())
+        if erros_processamento > 0:
+            logger.warning(f"Total de {erros_processamento} linhas inválidas descartadas")
+
+        df = df.loc[mask].astype({"seq_auto_infracao": "int64", "sq_enquadramento": "int64", "nu_norma": "int64"})
+        documentos = df.to_dict("records")
 
         if not documentos:
             logger.error(f"Nenhum registro válido encontrado. Total de erros: {erros_processamento}")
             raise HTTPException(400, "Nenhum registro válido encontrado.")
 
         logger.info(f"Processando inserção de {len(documentos)} enquadramentos válidos")
-        res = await enquadramento_collection.insert_many(documentos)
+        res = await enquadramento_collection.insert_many(documentos, ordered=False)
+        limpar_cache_respostas()
         
         logger.info(f"Upload concluído: {len(res.inserted_ids)} enquadramentos inseridos com sucesso")
         return [
@@ -126,7 +100,7 @@ async def get_stats_enquadramento_tipo_norma():
 async def count_enquadramento():
     logger.info("Contando total de enquadramentos na coleção")
     try:
-        count = await enquadramento_collection.count_documents({})
+        count = await enquadramento_collection.estimated_document_count()
         logger.info(f"Total de enquadramentos encontrados: {count}")
         return {"count": count}
     except Exception as e:
@@ -137,7 +111,7 @@ async def count_enquadramento():
 async def get_enquadramentos(page: int = 1, page_size: int = 10):
     logger.info(f"Buscando enquadramentos - Página: {page}, Tamanho: {page_size}")
     try:
-        total = await enquadramento_collection.count_documents({})
+        total = await enquadramento_collection.estimated_document_count()
         items = await enquadramento_collection.find().skip((page - 1) * page_size).limit(page_size).to_list(length=None)
         
         logger.info(f"Retornando {len(items)} enquadramentos de um total de {total}")
@@ -156,11 +130,7 @@ async def get_enquadramento_by_norma_and_adm(tp_norma: str, administrativo: str,
             "administrativo": administrativo
         }
 
-        # Conta o total de documentos que atendem ao filtro
-        total = await enquadramento_collection.count_documents(filter)
-        
-        # Busca os documentos com paginação
-        docs = await enquadramento_collection.find(filter).skip((page - 1) * page_size).limit(page_size).to_list(length=None)
+        docs, total = await pagina_e_total(enquadramento_collection, filter, (page - 1) * page_size, page_size)
 
         def serialize(doc):
             doc["_id"] = str(doc["_id"])
@@ -187,11 +157,7 @@ async def get_enquadramento_by_nu_norma(nu_norma: int, page: int = 1, page_size:
     try:
         filter = {"nu_norma": nu_norma}
         
-        # Conta o total de documentos que atendem ao filtro
-        total = await enquadramento_collection.count_documents(filter)
-        
-        # Busca os documentos com paginação
-        docs = await enquadramento_collection.find(filter).skip((page - 1) * page_size).limit(page_size).to_list(length=None)
+        docs, total = await pagina_e_total(enquadramento_collection, filter, (page - 1) * page_size, page_size)
 
         def serialize(doc):
             doc["_id"] = str(doc["_id"])
@@ -2,23 +2,37 @@ from typing import Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File
-from models.especime import EspecimeCreate, EspecimeOut, PaginatedEspecimeResponse
-from database import especime_collection
+from models.especime import EspecimeOut, PaginatedEspecimeResponse
+from database import especime_collection, pagina_e_total
+from cache import limpar_cache_respostas
 import pandas as pd
 import io
 from fastapi.responses import StreamingResponse
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from logs.logger import logger
 
 router = APIRouter(prefix="/especime", tags=["Especime"])
 
+COLUNA_ESPECIME = {
+    "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
+    "NUM_AUTO_INFRACAO": "num_auto_infracao",
+    "SEQ_ESPECIME": "seq_especime",
+    "QUANTIDADE": "quantidade",
+    "UNIDADE_MEDIDA": "unidade_medida",
+    "CARACTERISTICA": "caracteristica",
+    "TIPO": "tipo",
+    "NOME_CIENTIFICO": "nome_cientifico",
+    "NOME_POPULAR": "nome_popular"
+}
+
 
 @router.post("/upload", response_model=list[EspecimeOut])
 async def upload_especime_csv(file: UploadFile = File(...)):
     logger.info(f"Iniciando upload de arquivo CSV de espécimes: {file.filename}")
     try:
         df = pd.read_csv(
-            io.BytesIO(await file.read()),
+            file.file,
             sep=";",
             dtype=str,
             keep_default_na=False,
@@ -27,43 +41,30 @@ async def upload_especime_csv(file: UploadFile = File(...)):
         
         logger.info(f"Arquivo CSV carregado com {len(df)} linhas")
 
-        coluna_map = {
-            "SEQ_AUTO_INFRACAO": "seq_auto_infracao",
-            "NUM_AUTO_INFRACAO": "num_auto_infracao",
-            "SEQ_ESPECIME": "seq_especime",
-            "QUANTIDADE": "quantidade",
-            "UNIDADE_MEDIDA": "unidade_medida",
-            "CARACTERISTICA": "caracteristica",
-            "TIPO": "tipo",
-            "NOME_CIENTIFICO": "nome_cientifico",
-            "NOME_POPULAR": "nome_popular"
-        }
-
-        cols_existentes = [col for col in df.columns if col in coluna_map]
+        cols_existentes = [col for col in df.columns if col in COLUNA_ESPECIME]
         if not cols_existentes:
             logger.error("Nenhuma coluna válida encontrada no CSV")
             raise HTTPException(status_code=400, detail="Nenhuma coluna válida encontrada no CSV.")
 
-        df = df[cols_existentes].rename(columns=coluna_map)
+        # As demais colunas de COLUNA_ESPECIME, se faltarem, invalidam todas as linhas
+        df = df.reindex(columns=list(COLUNA_ESPECIME)).astype(object).rename(columns=COLUNA_ESPECIME)
 
-        documentos = []
-        erros_processamento = 0
-        for i, row in df.iterrows():
-            try:
-                doc_dict = row.to_dict()
+        # Conversão de tipos vetorizada: só inteiros escritos como o int() aceitava
+        # (sem "1.0" nem "1e3"), testados antes da conversão numérica
+        for col in ("seq_auto_infracao", "num_auto_infracao", "seq_especime", "quantidade"):
+            valores = df[col].str.strip()
+            df[col] = pd.to_numeric(valores.where(valores.str.fullmatch(r"[+-]?\d+", na=False)), errors="coerce")
 
-                # Conversão de tipos
-                doc_dict["seq_auto_infracao"] = int(doc_dict["seq_auto_infracao"])
-                doc_dict["num_auto_infracao"] = int(doc_dict["num_auto_infracao"])
-                doc_dict["seq_especime"] = int(doc_dict["seq_especime"])
-                doc_dict["quantidade"] = int(doc_dict["quantidade"])
+        mask = df.notna().all(axis=1)
+        erros_processamento = int((~mask).sum())
 
-                especime = EspecimeCreate(**doc_dict)
-                documentos.append(especime.dict())
-            except Exception as e:
-                erros_processamento += 1
-                logger.warning(f"Erro na linha {i+1}: {e}")
-                continue
+        df = df.loc[mask].astype({
+            "seq_auto_infracao": "int64",
+            "num_auto_infracao": "int64",
+            "seq_especime": "int64",
+            "quantidade": "int64"
+        })
+        documentos = df.to_dict("records")
 
         if erros_processamento > 0:
             logger.warning(f"Total de {erros_processamento} erros durante o processamento")
@@ -73,7 +74,8 @@ async def upload_especime_csv(file: UploadFile = File(...)):
             raise HTTPException(400, "Nenhum registro válido encontrado.")
 
         logger.info(f"Processando inserção de {len(documentos)} espécimes válidos")
-        res = await especime_collection.insert_many(documentos)
+        res = await especime_collection.insert_many(documentos, ordered=False)
+        limpar_cache_respostas()
         
         logger.info(f"Upload concluído: {len(res.inserted_ids)} espécimes inseridos com sucesso")
         return [
@@ -139,19 +141,19 @@ async def plot_stats_especime_tipo():
         totais = [item["total_especimes"] for item in stats]
 
         # Cria o gráfico
-        plt.figure(figsize=(10, 6))
-        plt.bar(tipos, totais, color='forestgreen')
-        plt.title("Total de Espécimes por Tipo")
-        plt.xlabel("Tipo")
-        plt.ylabel("Quantidade")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+        ax.bar(tipos, totais, color='forestgreen')
+        ax.set_title("Total de Espécimes por Tipo")
+        ax.set_xlabel("Tipo")
+        ax.set_ylabel("Quantidade")
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.tight_layout()
 
         # Salva em um buffer de memória
         buf = io.BytesIO()
-        plt.savefig(buf, format='png')
+        FigureCanvasAgg(fig).print_png(buf)
         buf.seek(0)
-        plt.close()
 
         return StreamingResponse(buf, media_type="image/png")
     except Exception as e:
@@ -164,7 +166,7 @@ async def get_especimes(page: int = 1, page_size: int = 10):
     logger.info(f"Buscando espécimes - Página: {page}, Tamanho: {page_size}")
     try:
         skip = (page - 1) * page_size
-        total = await especime_collection.count_documents({})
+        total = await especime_collection.estimated_document_count()
         especimes = await especime_collection.find({}).skip(skip).limit(page_size).to_list(length=page_size)
 
         def serialize(doc):
@@ -195,8 +197,7 @@ async def get_especimes_by_popular_name(page: int = 1, page_size: int = 10, text
         if texto:
             filter = {"nome_popular": {"$regex": texto, "$options": "i"}}
 
-        total = await especime_collection.count_documents(filter)
-        especimes = await especime_collection.find(filter).skip((page - 1) * page_size).limit(page_size).to_list(length=None)
+        especimes, total = await pagina_e_total(especime_collection, filter, (page - 1) * page_size, page_size)
 
         def serialize(doc):
             doc["_id"] = str(doc["_id"])
@@ -246,11 +247,7 @@ async def get_especimes_by_tipo(tipo: str, page: int = Query(1, ge=1), page_size
         # Filtro para buscar espécimes com o tipo específico (case-insensitive)
         filter = {"tipo": {"$regex": f"^{tipo}$", "$options": "i"}}
         
-        # Conta o total de documentos que atendem ao filtro
-        total = await especime_collection.count_documents(filter)
-        
-        # Busca os espécimes com paginação
-        especimes = await especime_collection.find(filter).skip((page - 1) * page_size).limit(page_size).to_list(length=None)
+        especimes, total = await pagina_e_total(especime_collection, filter, (page - 1) * page_size, page_size)
 
         def serialize(doc):
             doc["_id"] = str(doc["_id"])
@@ -275,7 +272,7 @@ async def get_especimes_by_tipo(tipo: str, page: int = Query(1, ge=1), page_size
 async def count_especime():
     logger.info("Contando total de espécimes na coleção")
     try:
-        count = await especime_collection.count_documents({})
+        count = await especime_collection.estimated_document_count()
         logger.info(f"Total de espécimes encontrados: {count}")
         return {"count": count}
     except Exception as e:
@@ -1,14 +1,13 @@
-from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File
 from fastapi.responses import StreamingResponse
-from models.infratores import InfratorCreate, InfratorOut, PaginatedInfratorResponse
-from database import infrator_collection, enquadramento_collection, auto_infracao_collection
-import matplotlib.pyplot as plt
+from models.infratores import InfratorOut, PaginatedInfratorResponse
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import infrator_collection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import pandas as pd
 import io
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import math
 from logs.logger import logger
 
 router = APIRouter(prefix="/infrator", tags=["Infrator"])
@@ -196,9 +195,16 @@ async def upload_csv(file: UploadFile = File(...)):
         infratores_inseridos = 0
         if infratores_para_inserir:
             try:
-                result = await infrator_collection.insert_many(infratores_para_inserir)
+                # Não ordenada: o servidor paraleliza a escrita e um documento
+                # rejeitado não interrompe a inserção dos demais
+                result = await infrator_collection.insert_many(infratores_para_inserir, ordered=False)
                 infratores_inseridos = len(result.inserted_ids)
                 logger.info(f"Inseridos {infratores_inseridos} novos infratores em lote")
+            except BulkWriteError as e:
+                infratores_inseridos = e.details.get("nInserted", 0)
+                erros_escrita = e.details.get("writeErrors", [])
+                logger.warning(f"Inseridos {infratores_inseridos} novos infratores; {len(erros_escrita)} rejeitados pelo banco")
+                erros.extend(f"Erro na inserção do infrator {erro.get('index')}: {erro.get('errmsg')}" for erro in erros_escrita)
             except Exception as e:
                 logger.error(f"Erro na inserção em lote: {str(e)}")
                 erros.append(f"Erro na inserção em lote: {str(e)}")
@@ -206,32 +212,32 @@ async def upload_csv(file: UploadFile = File(...)):
         # Atualizações em lote
         atualizacoes_realizadas = 0
         if infratores_para_atualizar:
+            # Um único bulk_write não ordenado: o servidor aplica o histórico e as datas
+            # ($min para o início, $max para o fim) sem ler antes cada infrator
+            operacoes = [
+                UpdateOne(
+                    {"_id": update_data["_id"]},
+                    {
+                        "$addToSet": {"historico_infracoes": {"$each": update_data["novas_infracoes"]}},
+                        "$min": {"dt_inicio_ato_inequivoco": update_data["dt_inicio"]},
+                        "$max": {"dt_fim_ato_inequivoco": update_data["dt_fim"]}
+                    }
+                )
+                for update_data in infratores_para_atualizar
+            ]
             try:
-                for update_data in infratores_para_atualizar:
-                    # Preparar atualizações
-                    update_fields = {"$addToSet": {"historico_infracoes": {"$each": update_data["novas_infracoes"]}}}
-                    
-                    # Atualizar dt_inicio se for mais antiga, dt_fim se for mais recente
-                    existing_doc = await infrator_collection.find_one({"_id": update_data["_id"]})
-                    if existing_doc:
-                        if update_data["dt_inicio"] < existing_doc.get("dt_inicio_ato_inequivoco", update_data["dt_inicio"]):
-                            update_fields["$set"] = update_fields.get("$set", {})
-                            update_fields["$set"]["dt_inicio_ato_inequivoco"] = update_data["dt_inicio"]
-                        
-                        if update_data["dt_fim"] > existing_doc.get("dt_fim_ato_inequivoco", update_data["dt_fim"]):
-                            update_fields["$set"] = update_fields.get("$set", {})
-                            update_fields["$set"]["dt_fim_ato_inequivoco"] = update_data["dt_fim"]
-                    
-                    await infrator_collection.update_one(
-                        {"_id": update_data["_id"]},
-                        update_fields
-                    )
-                    atualizacoes_realizadas += 1
-                    
-                logger.info(f"Atualizados {atualizacoes_realizadas} infratores existentes")
+                result = await infrator_collection.bulk_write(operacoes, ordered=False)
+                atualizacoes_realizadas = result.matched_count
+            except BulkWriteError as e:
+                atualizacoes_realizadas = e.details.get("nMatched", 0)
+                erros_escrita = e.details.get("writeErrors", [])
+                logger.warning(f"{len(erros_escrita)} atualizações de infratores rejeitadas pelo banco")
+                erros.extend(f"Erro na atualização do infrator {erro.get('index')}: {erro.get('errmsg')}" for erro in erros_escrita)
             except Exception as e:
                 logger.error(f"Erro nas atualizações: {str(e)}")
                 erros.append(f"Erro nas atualizações: {str(e)}")
+                
+            logger.info(f"Atualizados {atualizacoes_realizadas} infratores existentes")
         
         # Estatísticas do processamento
         total_registros = len(df)
@@ -261,7 +267,7 @@ async def get_infratores_stats():
     """
     try:
         # Total de infratores
-        total_infratores = await infrator_collection.count_documents({})
+        total_infratores = await infrator_collection.estimated_document_count()
         
         if total_infratores == 0:
             return {
@@ -325,7 +331,11 @@ async def list_infratores(
         skip = (page - 1) * size
         
         # Buscar total de registros
-        total = await infrator_collection.count_documents(filters)
+        # Sem filtros, o total vem dos metadados da coleção, sem varrer documentos
+        total = await (
+            infrator_collection.count_documents(filters) if filters
+            else infrator_collection.estimated_document_count()
+        )
         
         if total == 0:
             return PaginatedInfratorResponse(
@@ -377,7 +387,11 @@ async def count_infratores(
             filters["municipio"] = {"$regex": municipio, "$options": "i"}
         
         # Contar infratores
-        total = await infrator_collection.count_documents(filters)
+        # Sem filtros, o total vem dos metadados da coleção, sem varrer documentos
+        total = await (
+            infrator_collection.count_documents(filters) if filters
+            else infrator_collection.estimated_document_count()
+        )
         
         logger.info(f"Total de infratores encontrados: {total}")
         
@@ -394,43 +408,50 @@ async def infrator_report():
     """
     logger.info("Gerando relatório de infratores")
     try:
-        cursor = infrator_collection.find({})
-        data = await cursor.to_list(length=None)
+        # Contagens feitas no próprio banco: só os totais por estado/área trafegam,
+        # não a coleção inteira. Considera apenas infratores com as duas datas válidas.
+        pipeline = [
+            {"$match": {
+                "dt_inicio_ato_inequivoco": {"$type": "date"},
+                "dt_fim_ato_inequivoco": {"$type": "date"}
+            }},
+            {"$facet": {
+                "por_estado": [
+                    {"$match": {"estado": {"$ne": None}}},
+                    {"$group": {"_id": "$estado", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1, "_id": 1}}
+                ],
+                "por_area": [
+                    {"$match": {"infracao_area": {"$ne": None}}},
+                    {"$group": {"_id": "$infracao_area", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1, "_id": 1}}
+                ]
+            }}
+        ]
+        resultado = (await infrator_collection.aggregate(pipeline).to_list(1))[0]
+        infratores_por_estado = resultado["por_estado"]
+        infratores_por_area = resultado["por_area"]
 
-        if not data:
+        if not infratores_por_estado:
             logger.warning("Nenhum infrator encontrado para o relatório")
             return {"message": "Nenhum infrator encontrado para o relatório"}
-        
-        df = pd.DataFrame(data)
-        if df.empty:
-            logger.warning("DataFrame vazio, nenhum infrator encontrado")
-            return {"message": "Nenhum infrator encontrado para o relatório"}
-        
-        # Converter datas
-        df['dt_inicio_ato_inequivoco'] = pd.to_datetime(df['dt_inicio_ato_inequivoco'], errors='coerce')
-        df['dt_fim_ato_inequivoco'] = pd.to_datetime(df['dt_fim_ato_inequivoco'], errors='coerce')
-        df.dropna(subset=['dt_inicio_ato_inequivoco', 'dt_fim_ato_inequivoco'], inplace=True)
-        if df.empty:
-            logger.warning("Após conversão de datas, DataFrame ainda está vazio")
-            return {"message": "Nenhum infrator encontrado para o relatório"}
-        # Agrupar por estado
-        infratores_por_estado = df.groupby('estado').size().reset_index(name='count')
-        infratores_por_estado = infratores_por_estado.sort_values(by='count', ascending=False)
-        logger.info(f"Infratores por estado: {infratores_por_estado.to_dict(orient='records')}")
-        # Agrupar por área de infração
-        infratores_por_area = df.groupby('infracao_area').size().reset_index(name='count')
-        infratores_por_area = infratores_por_area.sort_values(by='count', ascending=False)
-        logger.info(f"Infratores por área de infração: {infratores_por_area.to_dict(orient='records')}")
+        logger.info(f"Infratores por estado: {infratores_por_estado}")
+        logger.info(f"Infratores por área de infração: {infratores_por_area}")
         # Criar gráfico de barras para infratores por estado
-        plt.figure(figsize=(10, 6))
-        plt.bar(infratores_por_estado['estado'], infratores_por_estado['count'], color='skyblue')
-        plt.title('Número de Infratores por Estado')
-        plt.xlabel('Estado')
-        plt.ylabel('Número de Infratores')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+        ax.bar(
+            [str(item["_id"]) for item in infratores_por_estado],
+            [item["count"] for item in infratores_por_estado],
+            color='skyblue'
+        )
+        ax.set_title('Número de Infratores por Estado')
+        ax.set_xlabel('Estado')
+        ax.set_ylabel('Número de Infratores')
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.tight_layout()
         img_estado = io.BytesIO()
-        plt.savefig(img_estado, format='png')
+        FigureCanvasAgg(fig).print_png(img_estado)
         img_estado.seek(0)
         
         logger.info("Gráfico de infratores por estado gerado com sucesso")
@@ -442,6 +463,4 @@ async def infrator_report():
     except Exception as e:
         logger.error(f"Erro ao gerar relatório de infratores: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de infratores: {str(e)}") 
-    finally:
-        plt.close()
 
@@ -0,0 +1,166 @@
+"""
+Cria os índices das coleções do IBAMAdb, preenche campos derivados
+de documentos antigos e confere se os $lookup por seq_auto_infracao
+e as consultas com hint usam índice.
+
+Uso (na raiz do projeto): python -m scripts.ensure_indexes
+"""
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from database import auto_infracao_collection, backfill_auto_infracao_location, database, ensure_indexes
+from logs.logger import logger
+from conversao_autos import geohash_encode
+
+TAMANHO_LOTE_BACKFILL = 1000
+
+
+async def backfill_auto_infracao_geohash() -> int:
+    """
+    Preenche o geohash dos autos de infração inseridos antes dele, para que a
+    busca por proximidade sem índice 2dsphere também os encontre.
+    """
+    cursor = auto_infracao_collection.find(
+        {
+            "geohash": {"$exists": False},
+            "num_longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+            "num_latitude": {"$type": "number", "$gte": -90, "$lte": 90}
+        },
+        projection={"_id": 1, "num_latitude": 1, "num_longitude": 1}
+    ).batch_size(TAMANHO_LOTE_BACKFILL)
+
+    atualizados = 0
+    operacoes = []
+    async for doc in cursor:
+        geohash = geohash_encode(doc["num_latitude"], doc["num_longitude"])
+        operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"geohash": geohash}}))
+        if len(operacoes) == TAMANHO_LOTE_BACKFILL:
+            atualizados += (await auto_infracao_collection.bulk_write(operacoes, ordered=False)).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += (await auto_infracao_collection.bulk_write(operacoes, ordered=False)).modified_count
+    return atualizados
+
+
+async def verificar_lookups():
+    """
+    Explica (executionStats) um $lookup de auto_infracao para cada coleção
+    filha e registra os índices usados no lado estrangeiro da junção.
+    """
+    for colecao in ("enquadramento", "especime"):
+        explicacao = await database.command({
+            "explain": {
+                "aggregate": "auto_infracao",
+                "pipeline": [
+                    {"$limit": 1},
+                    {"$lookup": {
+                        "from": colecao,
+                        "localField": "seq_auto_infracao",
+                        "foreignField": "seq_auto_infracao",
+                        "as": "filhos"
+                    }}
+                ],
+                "cursor": {}
+            },
+            "verbosity": "executionStats"
+        })
+        indices = [
+            indice
+            for estagio in explicacao.get("stages", [])
+            if "$lookup" in estagio
+            for indice in estagio.get("indexesUsed", [])
+        ]
+        if indices:
+            logger.info(f"$lookup em {colecao} usa os índices: {indices}")
+        else:
+            logger.warning(f"$lookup em {colecao} não usou índice (COLLSCAN por documento)")
+
+
+# Consultas das rotas que passam hint, reduzidas ao $match/$sort que o índice atende
+CONSULTAS_COM_HINT = (
+    ("idx_auto_data_id", [
+        {"$sort": {"dat_hora_auto_infracao": -1, "_id": -1}},
+        {"$limit": 10}
+    ]),
+    ("idx_auto_municipio_data", [
+        {"$match": {"municipio": ""}},
+        {"$sort": {"dat_hora_auto_infracao": -1, "_id": -1}},
+        {"$limit": 10}
+    ]),
+    ("idx_auto_bioma_data", [
+        {"$match": {"bioma": ""}},
+        {"$group": {"_id": "$bioma", "total_infracoes": {"$sum": 1}}}
+    ])
+)
+
+
+def _indices_do_plano(no) -> set[str]:
+    """Nomes de índice citados em qualquer ponto da saída do explain."""
+    if isinstance(no, dict):
+        indices = {no["indexName"]} if isinstance(no.get("indexName"), str) else set()
+        for valor in no.values():
+            indices |= _indices_do_plano(valor)
+        return indices
+    if isinstance(no, list):
+        return set().union(*(_indices_do_plano(item) for item in no))
+    return set()
+
+
+async def verificar_hints():
+    """
+    Explica (executionStats) as consultas de auto_infracao que usam hint e
+    confere se o índice existe e aparece no plano executado.
+    """
+    for indice, pipeline in CONSULTAS_COM_HINT:
+        try:
+            explicacao = await database.command({
+                "explain": {
+                    "aggregate": "auto_infracao",
+                    "pipeline": pipeline,
+                    "hint": indice,
+                    "cursor": {}
+                },
+                "verbosity": "executionStats"
+            })
+        except OperationFailure as e:
+            logger.warning(f"Hint {indice} recusado pelo servidor: {e}")
+            continue
+        if indice in _indices_do_plano(explicacao):
+            logger.info(f"Consulta com hint {indice} usa o índice")
+        else:
+            logger.warning(f"Consulta com hint {indice} não aparece com o índice no plano")
+
+
+# Índices substituídos por outros que os cobrem (mesmo prefixo): só custam escrita
+INDICES_OBSOLETOS = (
+    ("auto_infracao", "idx_auto_data"),  # prefixo de idx_auto_data_id
+)
+
+
+async def remover_indices_obsoletos():
+    for colecao, indice in INDICES_OBSOLETOS:
+        try:
+            await database[colecao].drop_index(indice)
+            logger.info(f"Índice obsoleto {indice} removido de {colecao}")
+        except OperationFailure:
+            # Já removido ou nunca criado
+            pass
+
+
+async def main():
+    atualizados = await backfill_auto_infracao_location()
+    logger.info(f"Localização GeoJSON preenchida em {atualizados} autos de infração")
+    atualizados = await backfill_auto_infracao_geohash()
+    logger.info(f"Geohash preenchido em {atualizados} autos de infração")
+    logger.info("Criando índices das coleções")
+    await ensure_indexes()
+    logger.info("Índices criados com sucesso")
+    await remover_indices_obsoletos()
+    await verificar_lookups()
+    await verificar_hints()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())